@@ -1,11 +1,23 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import datetime
 import base64
 import os
-from io import BytesIO
-import matplotlib.pyplot as plt
-import seaborn as sns
+from io import BytesIO, StringIO
+import unicodedata
+import re
+from bisect import bisect_left, insort
+import hashlib
+import json
+import secrets
+import sqlite3
+import sys
+import threading
+import zlib
+from collections import OrderedDict
+from contextlib import closing
+import altair as alt
 
 # Configuration de la page
 st.set_page_config(
@@ -54,7 +66,7 @@ def afficher_logo():
         unsafe_allow_html=True
     )
 
-# Dictionnaire des vicariats (à adapter selon votre organisation)
+# Dictionnaire des vicariats : organisation initiale du registre (voir RegistreOrganisation)
 VICARIATS = {
     "Cotonou": ["St Michel", "St Jean", "Notre Dame", "St Pierre", "St Paul"],
     "Abomey-Calavi": ["St Jacques", "Ste Marie", "St Marc"],
@@ -65,53 +77,464 @@ VICARIATS = {
 # Ordre des grades
 GRADES_ORDRE = ['Lectorat 2', 'Animation 1', 'Animation 2', 'Formation 1', 'Formation 2']
 
+# Palette des grades partagée par les graphiques du tableau de bord
+ECHELLE_GRADES = alt.Scale(domain=GRADES_ORDRE, range=['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FFEAA7'])
+
+# Fichier optionnel décrivant l'organisation (prioritaire sur la base SQLite)
+CHEMIN_ORGANISATION = "organisation.json"
+
+# Colonnes des compositions
+COLONNES_COMPOS = ['COMPO1', 'COMPO2', 'COMPO3', 'COMPO4', 'COMPO5']
+
+# Décisions comptées comme admission
+DECISIONS_ADMIS = ['Admis', 'Admis_Passe au grade immédiatement supérieur']
+
+# Décision affichée tant qu'une note en désaccord entre correcteurs n'est pas arbitrée (ni moyenne ni rang)
+DECISION_ARBITRAGE = "En attente d'arbitrage"
+
+# Instantané des résultats proclamés, lu par le service de consultation (service_resultats.py) :
+# ni noms ni matricules, chaque résultat est rangé sous une clé dérivée (matricule, date de naissance)
+CHEMIN_PUBLICATION = "resultats_publies_{activite}.json"
+COLONNES_CONSULTATION = ['grade', 'moyenne', 'rang', 'mention', 'decision']
+
+# Publication statique : résultats répartis par début de clé (256 lots), plus une page de recherche
+LONGUEUR_PREFIXE_PUBLICATION = 2
+CHEMIN_PAGE_PUBLICATION = os.path.join(os.path.dirname(os.path.abspath(__file__)), "page_publication.html")
+
+# Base SQLite de l'application (matricules, candidats tardifs, notes...)
+CHEMIN_BASE = "compositions_ecole.db"
+
+# Budget mémoire (Mo) du cache des rosters et résultats partagé par toutes les sessions
+TAILLE_CACHE_PARTAGE_MO = int(os.environ.get("CDLJ_CACHE_PARTAGE_MO", "512"))
+
+# Taille maximale (Mo) d'une archive proposée au téléchargement (Streamlit la garde en mémoire le temps du téléchargement)
+TAILLE_MAX_TELECHARGEMENT_MO = int(os.environ.get("CDLJ_TELECHARGEMENT_MAX_MO", "200"))
+
+def connexion_base(chemin_base=CHEMIN_BASE):
+    """Ouvrir une connexion à la base SQLite de l'application"""
+    return closing(sqlite3.connect(chemin_base, timeout=30))
+
+def normaliser_texte(valeur):
+    """Normaliser un texte (accents, casse, espaces) pour les comparaisons"""
+    if valeur is None or pd.isna(valeur):
+        return ""
+    texte = unicodedata.normalize('NFKD', str(valeur)).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(texte.lower().replace('-', ' ').split())
+
+def normaliser_serie(serie):
+    """Normaliser une colonne de texte en une seule passe vectorisée"""
+    return (
+        serie.fillna('').astype(str)
+        .str.normalize('NFKD')
+        .str.encode('ascii', 'ignore').str.decode('ascii')
+        .str.lower()
+        .str.replace(r'[\s\-]+', ' ', regex=True)
+        .str.strip()
+    )
+
+def cles_candidats(noms, prenoms):
+    """Clés d'identité normalisées (sans accents, casse ni espaces) pour une série de candidats"""
+    return (normaliser_serie(noms) + '|' + normaliser_serie(prenoms)).str.replace(' ', '', regex=False)
+
+def cle_candidat(nom, prenom):
+    """Clé d'identité normalisée d'un seul candidat"""
+    return f"{normaliser_texte(nom)}|{normaliser_texte(prenom)}".replace(' ', '')
+
+def distance_edition(a, b, distance_max=None):
+    """Distance de Levenshtein entre deux textes (arrêt anticipé au-delà de distance_max)"""
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if distance_max is not None and len(a) - len(b) > distance_max:
+        return distance_max + 1
+    
+    ligne_precedente = list(range(len(b) + 1))
+    for i, car_a in enumerate(a, 1):
+        ligne = [i]
+        for j, car_b in enumerate(b, 1):
+            ligne.append(min(
+                ligne_precedente[j] + 1,
+                ligne[j - 1] + 1,
+                ligne_precedente[j - 1] + (car_a != car_b)
+            ))
+        if distance_max is not None and min(ligne) > distance_max:
+            return distance_max + 1
+        ligne_precedente = ligne
+    return ligne_precedente[-1]
+
+def histogramme_caracteres(cle):
+    """Nombre d'occurrences de chaque caractère ASCII d'une clé normalisée"""
+    return np.bincount(np.frombuffer(cle.encode('ascii', 'ignore'), dtype=np.uint8), minlength=128)[:128]
+
+def empreinte_resultats(df):
+    """Empreinte de contenu d'un jeu de résultats (identifie une version des résultats)"""
+    empreinte = hashlib.sha256('|'.join(map(str, df.columns)).encode())
+    empreinte.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return empreinte.hexdigest()[:16]
+
+def empreinte_fichier(fichier):
+    """Empreinte du contenu d'un fichier importé (indépendante du nom et de la session)"""
+    return hashlib.sha256(fichier.getvalue()).hexdigest()[:16]
+
+def taille_objet(valeur):
+    """Estimer la mémoire occupée (octets) par une valeur mise en cache"""
+    if isinstance(valeur, (pd.DataFrame, pd.Series)):
+        return int(np.sum(valeur.memory_usage(index=True, deep=True)))
+    if isinstance(valeur, dict):
+        return sys.getsizeof(valeur) + sum(taille_objet(cle) + taille_objet(v) for cle, v in valeur.items())
+    if isinstance(valeur, (list, tuple, set, frozenset)):
+        return sys.getsizeof(valeur) + sum(taille_objet(v) for v in valeur)
+    return sys.getsizeof(valeur)
+
+class JournalImport:
+    """Messages d'un import conservés comme données : le résultat mis en cache est partagé, l'affichage reste propre à chaque session"""
+    
+    def __init__(self):
+        self.messages = []
+    
+    def success(self, texte):
+        self.messages.append(('success', texte))
+    
+    def info(self, texte):
+        self.messages.append(('info', texte))
+    
+    def warning(self, texte):
+        self.messages.append(('warning', texte))
+    
+    def error(self, texte):
+        self.messages.append(('error', texte))
+    
+    def write(self, texte):
+        self.messages.append(('write', texte))
+    
+    def dataframe(self, df):
+        self.messages.append(('dataframe', df))
+    
+    def etendre(self, autre):
+        """Ajouter les messages d'un autre journal"""
+        self.messages.extend(autre.messages)
+    
+    def entrees(self):
+        """Messages figés (valeur partageable par le cache)"""
+        return tuple(self.messages)
+
+def afficher_journal(entrees, cible=st):
+    """Afficher dans la session courante les messages d'un import"""
+    for niveau, contenu in entrees:
+        if niveau == 'dataframe':
+            cible.dataframe(contenu, use_container_width=True)
+        else:
+            getattr(cible, niveau)(contenu)
+
+def copie_session(valeur):
+    """Vue propre à une session d'une valeur partagée (tableaux non recopiés, ensembles modifiables)"""
+    if isinstance(valeur, (pd.DataFrame, pd.Series)):
+        return valeur.copy(deep=False)
+    if isinstance(valeur, frozenset):
+        return set(valeur)
+    if isinstance(valeur, dict):
+        return {cle: copie_session(v) for cle, v in valeur.items()}
+    if isinstance(valeur, tuple):
+        return tuple(copie_session(v) for v in valeur)
+    return valeur
+
+class CachePartage:
+    """Cache LRU commun aux sessions : un seul exemplaire (en lecture seule) par contenu de fichier et activité"""
+    
+    def __init__(self, taille_max=TAILLE_CACHE_PARTAGE_MO * 1024 * 1024):
+        self.taille_max = taille_max
+        self.entrees = OrderedDict()  # clé -> (valeur, taille en octets)
+        self.taille_totale = 0
+        self.succes = 0
+        self.constructions = 0
+        self.verrou = threading.Lock()
+        self.verrous_construction = {}
+    
+    def obtenir(self, cle, construire):
+        """Valeur associée à la clé, construite une seule fois même si plusieurs sessions la demandent ensemble"""
+        with self.verrou:
+            if cle in self.entrees:
+                return self._lire(cle)
+            verrou_cle = self.verrous_construction.setdefault(cle, threading.Lock())
+        
+        try:
+            with verrou_cle:
+                with self.verrou:
+                    if cle in self.entrees:
+                        return self._lire(cle)
+                valeur = construire()
+                with self.verrou:
+                    self.constructions += 1
+                    self._stocker(cle, valeur)
+                return valeur
+        finally:
+            with self.verrou:
+                self.verrous_construction.pop(cle, None)
+    
+    def _lire(self, cle):
+        self.entrees.move_to_end(cle)
+        self.succes += 1
+        return self.entrees[cle][0]
+    
+    def _stocker(self, cle, valeur):
+        taille = taille_objet(valeur)
+        if taille > self.taille_max:
+            return  # Trop volumineux pour être partagé : la session garde sa propre copie
+        while self.entrees and self.taille_totale + taille > self.taille_max:
+            _, (_, taille_evincee) = self.entrees.popitem(last=False)
+            self.taille_totale -= taille_evincee
+        self.entrees[cle] = (valeur, taille)
+        self.taille_totale += taille
+    
+    def vider(self):
+        """Vider le cache (nouveaux fichiers de référence, tests)"""
+        with self.verrou:
+            self.entrees.clear()
+            self.taille_totale = 0
+    
+    def statistiques(self):
+        """Occupation du cache pour l'affichage"""
+        with self.verrou:
+            return {
+                'entrees': len(self.entrees),
+                'taille_mo': self.taille_totale / (1024 * 1024),
+                'taille_max_mo': self.taille_max / (1024 * 1024),
+                'succes': self.succes,
+                'constructions': self.constructions
+            }
+
+@st.cache_resource(show_spinner=False)
+def cache_partage():
+    """Cache unique du processus, partagé par toutes les sessions Streamlit"""
+    return CachePartage()
+
+def cles_organisation(serie):
+    """Clés de rapprochement des noms de paroisses et vicariats (accents, casse, « Saint »/« St »)"""
+    return (
+        normaliser_serie(serie)
+        .str.replace(r'[.\'’]', ' ', regex=True)
+        .str.replace(r'\bsainte\b', 'ste', regex=True)
+        .str.replace(r'\bsaint\b', 'st', regex=True)
+        .str.replace(r'\s+', ' ', regex=True)
+        .str.strip()
+    )
+
+class RegistreOrganisation:
+    """Registre vicariat → paroisses (avec alias), indexé pour les recherches et la normalisation des imports"""
+    
+    NON_SPECIFIE = "Non spécifié"
+    
+    def __init__(self, paroisses, alias=None):
+        # paroisses : {paroisse: vicariat} ; alias : {alias: nom canonique (paroisse ou vicariat)}
+        self.vicariat_par_paroisse = dict(paroisses)
+        self.vicariats = sorted(set(self.vicariat_par_paroisse.values()))
+        self.paroisses = sorted(self.vicariat_par_paroisse)
+        self.paroisses_par_vicariat = {
+            vicariat: sorted(p for p, v in self.vicariat_par_paroisse.items() if v == vicariat)
+            for vicariat in self.vicariats
+        }
+        
+        # Index normalisés : nom ou alias -> nom canonique
+        noms = pd.Series(self.paroisses + self.vicariats + list((alias or {}).keys()), dtype=object)
+        cibles = self.paroisses + self.vicariats + list((alias or {}).values())
+        cles = cles_organisation(noms).tolist()
+        self.index_paroisses = {c: n for c, n in zip(cles, cibles) if n in self.vicariat_par_paroisse}
+        self.index_vicariats = {c: n for c, n in zip(cles, cibles) if n in self.paroisses_par_vicariat}
+    
+    @classmethod
+    def depuis_dictionnaire(cls, vicariats, alias=None):
+        """Construire le registre depuis {vicariat: [paroisses]}"""
+        return cls({p: v for v, paroisses in vicariats.items() for p in paroisses}, alias)
+    
+    @classmethod
+    def depuis_fichier(cls, chemin=CHEMIN_ORGANISATION):
+        """Charger le registre depuis un fichier JSON {vicariat: {"paroisses": {paroisse: [alias]}, "alias": [alias]}}"""
+        with open(chemin, encoding='utf-8') as fichier:
+            donnees = json.load(fichier)
+        paroisses, alias = {}, {}
+        for vicariat, contenu in donnees.items():
+            for a in contenu.get('alias', []):
+                alias[a] = vicariat
+            for paroisse, alias_paroisse in contenu.get('paroisses', {}).items():
+                paroisses[paroisse] = vicariat
+                for a in alias_paroisse:
+                    alias[a] = paroisse
+        return cls(paroisses, alias)
+    
+    @classmethod
+    def depuis_base(cls, chemin_base=CHEMIN_BASE):
+        """Charger le registre depuis la base SQLite (initialisé avec VICARIATS si vide)"""
+        with connexion_base(chemin_base) as conn, conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS organisation_paroisses (
+                    paroisse TEXT PRIMARY KEY,
+                    vicariat TEXT NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS organisation_alias (
+                    alias TEXT PRIMARY KEY,
+                    nom_canonique TEXT NOT NULL
+                )
+            """)
+            if conn.execute("SELECT COUNT(*) FROM organisation_paroisses").fetchone()[0] == 0:
+                conn.executemany(
+                    "INSERT INTO organisation_paroisses (paroisse, vicariat) VALUES (?, ?)",
+                    [(p, v) for v, paroisses in VICARIATS.items() for p in paroisses]
+                )
+            paroisses = dict(conn.execute("SELECT paroisse, vicariat FROM organisation_paroisses").fetchall())
+            alias = dict(conn.execute("SELECT alias, nom_canonique FROM organisation_alias").fetchall())
+        return cls(paroisses, alias)
+    
+    def determiner_vicariat(self, paroisse):
+        """Vicariat d'une paroisse (nom libre accepté)"""
+        paroisse = self.index_paroisses.get(cles_organisation(pd.Series([paroisse], dtype=object)).iloc[0])
+        return self.vicariat_par_paroisse.get(paroisse, self.NON_SPECIFIE)
+    
+    def normaliser_paroisses(self, serie):
+        """Remplacer les noms libres de paroisses par leur nom canonique (inconnus conservés) en une passe"""
+        canoniques = cles_organisation(serie).map(self.index_paroisses)
+        return canoniques.fillna(serie)
+    
+    def normaliser_vicariats(self, serie):
+        """Remplacer les noms libres de vicariats par leur nom canonique (inconnus conservés) en une passe"""
+        canoniques = cles_organisation(serie).map(self.index_vicariats)
+        return canoniques.fillna(serie)
+    
+    def vicariats_des_paroisses(self, serie):
+        """Vicariat de chaque paroisse canonique (Non spécifié si inconnue)"""
+        return serie.map(self.vicariat_par_paroisse).fillna(self.NON_SPECIFIE)
+
+@st.cache_resource(show_spinner=False)
+def charger_registre_organisation(chemin_fichier=CHEMIN_ORGANISATION, chemin_base=CHEMIN_BASE):
+    """Charger une seule fois le registre de l'organisation (fichier s'il existe, sinon base SQLite)"""
+    try:
+        if os.path.exists(chemin_fichier):
+            return RegistreOrganisation.depuis_fichier(chemin_fichier)
+        return RegistreOrganisation.depuis_base(chemin_base)
+    except Exception:
+        return RegistreOrganisation.depuis_dictionnaire(VICARIATS)
+
 def determiner_vicariat(paroisse):
     """Déterminer le vicariat à partir de la paroisse"""
-    for vicariat, paroisses in VICARIATS.items():
-        if paroisse in paroisses:
-            return vicariat
-    return "Non spécifié"
+    return charger_registre_organisation().determiner_vicariat(paroisse)
+
+# Schémas des fichiers importés : colonne canonique -> synonymes acceptés dans les en-têtes
+# (comparaison sans casse, accents, espaces ni ponctuation ; l'ordre des synonymes fixe la priorité)
+SCHEMA_CANDIDATS = {
+    'nom': ['noms', 'nom de famille', 'last name', 'surname'],
+    'prenom': ['prenoms', 'first name'],
+    'grade': ['grades', 'niveau', 'classe'],
+    'genre': ['sexe', 'sex', 'gender'],
+    'date_naissance': ['date de naissance', 'naissance', 'ne le', 'nee le', 'date of birth'],
+    'paroisse': ['paroisses', 'communaute', 'parish'],
+    'vicariat': ['vicariats', 'zone', 'zones', 'secteur', 'secteurs']
+}
+SCHEMA_NOTES = {
+    'matricule': ['matricules', 'mat', 'numero matricule', 'n matricule', 'no matricule'],
+    'nom': ['noms', 'nom de famille'],
+    'prenom': ['prenoms'],
+    'grade': ['grades', 'niveau'],
+    **{col: [f"compo {col[-1]}", f"composition {col[-1]}", f"comp{col[-1]}", f"note {col[-1]}"] for col in COLONNES_COMPOS}
+}
+SCHEMA_RESULTATS = {
+    'matricule': ['matricules'],
+    'grade': ['grades', 'niveau'],
+    'vicariat': ['vicariats', 'zone', 'secteur'],
+    'moyenne': ['moyennes', 'moy', 'note', 'note finale'],
+    'decision': ['decisions', 'resultat']
+}
+
+# Types imposés à la lecture (les colonnes numériques retombent en lecture souple si une cellule est invalide)
+TYPES_CANDIDATS = {col: str for col in ['nom', 'prenom', 'grade', 'genre', 'paroisse', 'vicariat']}
+TYPES_NOTES = {'matricule': str, 'nom': str, 'prenom': str, 'grade': str, **{col: 'float64' for col in COLONNES_COMPOS}}
+TYPES_RESULTATS = {'matricule': str, 'grade': str, 'vicariat': str, 'decision': str, 'moyenne': 'float64'}
+
+def cle_colonne(nom):
+    """Clé de comparaison d'un en-tête de colonne (casse, accents, espaces et ponctuation ignorés)"""
+    return re.sub(r'[^a-z0-9]', '', normaliser_texte(nom))
+
+def resoudre_colonnes(colonnes, schema):
+    """Associer les en-têtes d'une feuille aux colonnes canoniques du schéma : {en-tête: canonique}"""
+    index = {}
+    for canonique, synonymes in schema.items():
+        for rang, synonyme in enumerate([canonique] + synonymes):
+            index.setdefault(cle_colonne(synonyme), (canonique, rang))
+    
+    # Pour chaque colonne canonique, retenir l'en-tête du synonyme le plus prioritaire
+    candidats = sorted(
+        (index[cle_colonne(colonne)][1], position, colonne, index[cle_colonne(colonne)][0])
+        for position, colonne in enumerate(colonnes) if cle_colonne(colonne) in index
+    )
+    correspondances = {}
+    for _, _, colonne, canonique in candidats:
+        if canonique not in correspondances.values():
+            correspondances[colonne] = canonique
+    return correspondances
+
+def lire_tableau(source, schema, sheet_name=0, dtypes=None):
+    """Lire une feuille Excel (ou un CSV) en ne chargeant que les colonnes du schéma, renommées en canonique"""
+    est_csv = not isinstance(source, pd.ExcelFile) and getattr(source, 'name', '').lower().endswith('.csv')
+    if est_csv:
+        entetes = pd.read_csv(source, nrows=0, sep=None, engine='python').columns
+        source.seek(0)
+    else:
+        if not isinstance(source, pd.ExcelFile):
+            source = pd.ExcelFile(source, engine='openpyxl')
+        entetes = source.parse(sheet_name, nrows=0).columns
+    
+    correspondances = resoudre_colonnes(entetes, schema)
+    colonnes = list(correspondances)
+    types = {col: dtypes[canonique] for col, canonique in correspondances.items() if dtypes and canonique in dtypes}
+    
+    def lire(types_lecture):
+        if est_csv:
+            source.seek(0)
+            return pd.read_csv(source, usecols=colonnes, dtype=types_lecture, sep=None, engine='python')
+        return source.parse(sheet_name, usecols=colonnes, dtype=types_lecture)
+    
+    try:
+        df = lire(types)
+    except (ValueError, TypeError):
+        # Cellule non convertible : relire sans les types numériques, la validation signalera les valeurs fautives
+        df = lire({col: type_col for col, type_col in types.items() if type_col is str})
+    return df.rename(columns=correspondances), correspondances
 
 def detecter_vicariats_automatiquement(df_candidats):
     """Détecter automatiquement les vicariats depuis les données"""
-    # Vérifier différentes variantes de noms de colonnes
-    noms_vicariat_possibles = ['vicariat', 'Vicariat', 'vicariats', 'Vicariats', 'zone', 'Zone', 'secteur', 'Secteur']
-    
-    for nom_colonne in noms_vicariat_possibles:
-        if nom_colonne in df_candidats.columns:
-            vicariats_uniques = df_candidats[nom_colonne].dropna().unique()
-            st.info(f"Vicariats détectés dans la colonne '{nom_colonne}': {list(vicariats_uniques)}")
-            return list(vicariats_uniques), nom_colonne
+    # La colonne a déjà été identifiée parmi ses variantes (vicariat, zone, secteur...) par le schéma d'import
+    if 'vicariat' in df_candidats.columns:
+        vicariats_uniques = df_candidats['vicariat'].dropna().unique()
+        st.info(f"Vicariats détectés dans la colonne 'vicariat': {list(vicariats_uniques)}")
+        return list(vicariats_uniques), 'vicariat'
     
     st.warning("Aucune colonne de vicariat trouvée dans les données")
     return ["Non spécifié"], "vicariat"
 
-def normaliser_colonne_vicariat(df):
-    """Normaliser la colonne vicariat pour avoir toujours 'vicariat' comme nom de colonne"""
-    noms_vicariat_possibles = ['vicariat', 'Vicariat', 'vicariats', 'Vicariats', 'zone', 'Zone', 'secteur', 'Secteur']
-    
-    for nom_colonne in noms_vicariat_possibles:
-        if nom_colonne in df.columns:
-            if nom_colonne != 'vicariat':
-                df['vicariat'] = df[nom_colonne]
-                st.info(f"Colonne '{nom_colonne}' renommée en 'vicariat'")
-            return df
+def normaliser_colonne_vicariat(df, journal=None):
+    """Garantir la présence d'une colonne 'vicariat' (les variantes d'en-tête sont résolues par le schéma d'import)"""
+    journal = st if journal is None else journal
+    if 'vicariat' in df.columns:
+        return df
     
     # Si aucune colonne n'est trouvée, créer une colonne vicariat par défaut
     if 'paroisse' in df.columns:
-        df['vicariat'] = df['paroisse'].apply(determiner_vicariat)
-        st.info("Colonne 'vicariat' créée à partir des paroisses")
+        registre = charger_registre_organisation()
+        df['vicariat'] = registre.vicariats_des_paroisses(registre.normaliser_paroisses(df['paroisse']))
+        journal.info("Colonne 'vicariat' créée à partir des paroisses")
     else:
         df['vicariat'] = "Non spécifié"
-        st.warning("Colonne 'vicariat' créée avec valeur par défaut")
+        journal.warning("Colonne 'vicariat' créée avec valeur par défaut")
     
     return df
 
 class TableauBordCompositions:
-    def __init__(self, df_candidats, df_resultats, activite):
+    def __init__(self, df_candidats, df_resultats, activite, bareme=None):
         self.df_candidats = df_candidats
         self.df_resultats = df_resultats
         self.activite = activite
+        self.bareme = bareme or BaremeNotation()
     
     def afficher_entete_activite(self):
         """Afficher l'en-tête avec le nom de l'activité"""
@@ -185,21 +608,18 @@ class TableauBordCompositions:
                 st.write("**Nombre de candidats par grade:**")
                 st.dataframe(count_by_grade, use_container_width=True)
                 
-                # Graphique avec couleurs personnalisées
-                fig, ax = plt.subplots(figsize=(10, 6))
-                colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FFEAA7']
-                bars = ax.bar(count_by_grade['Grade'], count_by_grade['Nombre de Candidats'], color=colors)
-                ax.set_title('Répartition des Candidats par Grade', fontsize=14, fontweight='bold')
-                ax.set_ylabel('Nombre de Candidats')
-                plt.xticks(rotation=45)
-                
-                # Ajouter les valeurs sur les barres
-                for bar in bars:
-                    height = bar.get_height()
-                    ax.text(bar.get_x() + bar.get_width()/2., height,
-                            f'{int(height)}', ha='center', va='bottom')
-                
-                st.pyplot(fig)
+                # Graphique avec couleurs personnalisées, rendu par le navigateur
+                donnees = count_by_grade.assign(Grade=count_by_grade['Grade'].astype(str))
+                barres = alt.Chart(donnees).mark_bar().encode(
+                    x=alt.X('Grade:N', sort=GRADES_ORDRE, axis=alt.Axis(labelAngle=-45)),
+                    y=alt.Y('Nombre de Candidats:Q'),
+                    color=alt.Color('Grade:N', scale=ECHELLE_GRADES, legend=None),
+                    tooltip=['Grade', 'Nombre de Candidats']
+                )
+                valeurs = barres.mark_text(dy=-6).encode(text='Nombre de Candidats:Q')
+                st.altair_chart((barres + valeurs).properties(
+                    title='Répartition des Candidats par Grade', height=350
+                ), use_container_width=True)
             
             with col2:
                 # Compter les candidats par vicariat
@@ -210,19 +630,18 @@ class TableauBordCompositions:
                 st.dataframe(count_by_vicariat, use_container_width=True)
                 
                 # Graphique circulaire pour les vicariats
-                fig, ax = plt.subplots(figsize=(8, 8))
-                colors = ['#FF9999', '#66B2FF', '#99FF99', '#FFD700', '#FF69B4']
-                wedges, texts, autotexts = ax.pie(count_by_vicariat['Nombre de Candidats'], 
-                                                labels=count_by_vicariat['Vicariat'],
-                                                autopct='%1.1f%%', colors=colors, startangle=90)
-                ax.set_title('Répartition des Candidats par Vicariat', fontsize=14, fontweight='bold')
-                
-                # Améliorer l'apparence
-                for autotext in autotexts:
-                    autotext.set_color('white')
-                    autotext.set_fontweight('bold')
-                
-                st.pyplot(fig)
+                donnees = count_by_vicariat.assign(
+                    Part=(count_by_vicariat['Nombre de Candidats'] / count_by_vicariat['Nombre de Candidats'].sum() * 100).round(1)
+                )
+                secteurs = alt.Chart(donnees).mark_arc(outerRadius=130).encode(
+                    theta=alt.Theta('Nombre de Candidats:Q', stack=True),
+                    color=alt.Color('Vicariat:N', legend=alt.Legend(title='Vicariat')),
+                    tooltip=['Vicariat', 'Nombre de Candidats', alt.Tooltip('Part:Q', title='Part (%)')]
+                )
+                etiquettes = secteurs.mark_text(radius=150).encode(text=alt.Text('Part:Q', format='.1f'))
+                st.altair_chart((secteurs + etiquettes).properties(
+                    title='Répartition des Candidats par Vicariat', height=350
+                ), use_container_width=True)
             
         else:
             st.info("Aucune donnée de candidats disponible")
@@ -252,24 +671,25 @@ class TableauBordCompositions:
             
             # Graphique des moyennes par grade
             st.write("**Moyennes par grade:**")
-            fig, ax = plt.subplots(figsize=(12, 6))
-            moyennes_par_grade = self.df_resultats.groupby('grade')['moyenne'].mean().round(2)
-            moyennes_par_grade = moyennes_par_grade.reindex(GRADES_ORDRE)
-            
-            colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FFEAA7']
-            bars = ax.bar(moyennes_par_grade.index, moyennes_par_grade.values, color=colors)
-            ax.axhline(y=12, color='red', linestyle='--', alpha=0.7, label='Seuil de validation (12)')
-            ax.set_title('Moyennes des Notes par Grade', fontsize=14, fontweight='bold')
-            ax.set_ylabel('Moyenne')
-            ax.legend()
-            
-            # Ajouter les valeurs sur les barres
-            for bar in bars:
-                height = bar.get_height()
-                ax.text(bar.get_x() + bar.get_width()/2., height,
-                        f'{height:.2f}', ha='center', va='bottom', fontweight='bold')
-            
-            st.pyplot(fig)
+            moyennes_par_grade = stats['Moyenne'].dropna().rename_axis('Grade').reset_index()
+            moyennes_par_grade['Seuil de validation'] = moyennes_par_grade['Grade'].map(self.bareme.seuils_reussite)
+            
+            barres = alt.Chart(moyennes_par_grade).mark_bar().encode(
+                x=alt.X('Grade:N', sort=GRADES_ORDRE),
+                y=alt.Y('Moyenne:Q', scale=alt.Scale(domain=[0, 20])),
+                color=alt.Color('Grade:N', scale=ECHELLE_GRADES, legend=None),
+                tooltip=['Grade', alt.Tooltip('Moyenne:Q', format='.2f')]
+            )
+            valeurs = barres.mark_text(dy=-6, fontWeight='bold').encode(text=alt.Text('Moyenne:Q', format='.2f'))
+            # Seuil de réussite du barème, grade par grade
+            seuil = alt.Chart(moyennes_par_grade).mark_tick(color='red', thickness=2, size=40, opacity=0.7).encode(
+                x=alt.X('Grade:N', sort=GRADES_ORDRE),
+                y='Seuil de validation:Q',
+                tooltip=['Grade', 'Seuil de validation']
+            )
+            st.altair_chart((barres + valeurs + seuil).properties(
+                title='Moyennes des Notes par Grade', height=350
+            ), use_container_width=True)
             
             # Afficher la répartition des décisions
             if 'decision' in self.df_resultats.columns:
@@ -279,13 +699,15 @@ class TableauBordCompositions:
                 st.dataframe(decisions_par_grade)
                 
                 # Graphique des décisions
-                fig, ax = plt.subplots(figsize=(12, 6))
-                decisions_par_grade.plot(kind='bar', ax=ax, color=['#FF6B6B', '#4ECDC4', '#96CEB4'])
-                ax.set_title('Répartition des Décisions par Grade', fontsize=14, fontweight='bold')
-                ax.set_ylabel('Nombre de Candidats')
-                ax.legend(title='Décision')
-                plt.xticks(rotation=45)
-                st.pyplot(fig)
+                donnees = decisions_par_grade.dropna(how='all').rename_axis(index='Grade', columns='Décision') \
+                    .stack().rename('Nombre de Candidats').reset_index()
+                st.altair_chart(alt.Chart(donnees).mark_bar().encode(
+                    x=alt.X('Grade:N', sort=GRADES_ORDRE, axis=alt.Axis(labelAngle=-45)),
+                    xOffset='Décision:N',
+                    y=alt.Y('Nombre de Candidats:Q'),
+                    color=alt.Color('Décision:N', scale=alt.Scale(range=['#FF6B6B', '#4ECDC4', '#96CEB4'])),
+                    tooltip=['Grade', 'Décision', 'Nombre de Candidats']
+                ).properties(title='Répartition des Décisions par Grade', height=350), use_container_width=True)
                 
                 # Interprétation des décisions
                 self.afficher_interpretation_decisions(decisions_par_grade)
@@ -293,6 +715,137 @@ class TableauBordCompositions:
         else:
             st.info("Aucun résultat disponible")
     
+    def obtenir_distributions(self):
+        """Distributions des moyennes, calculées une fois par version des résultats"""
+        return calculer_distributions(self.df_resultats, empreinte_resultats(self.df_resultats))
+    
+    def afficher_distributions(self):
+        """Afficher les histogrammes et percentiles des moyennes par grade et par vicariat"""
+        st.subheader("📉 Distribution des Moyennes")
+        
+        if self.df_resultats.empty or 'moyenne' not in self.df_resultats.columns:
+            st.info("Aucun résultat disponible")
+            return
+        
+        distributions = self.obtenir_distributions()
+        
+        st.write("**Percentiles des moyennes (ensemble des candidats):**")
+        st.dataframe(distributions['percentiles']['global'].to_frame('Moyenne').T, use_container_width=True)
+        
+        for cle, titre in [('grade', 'grade'), ('vicariat', 'vicariat')]:
+            st.write(f"**Percentiles par {titre}:**")
+            st.dataframe(distributions['percentiles'][cle], use_container_width=True)
+            
+            histogrammes = distributions['histogrammes'][cle]
+            donnees = histogrammes.rename_axis(index=titre.capitalize(), columns='Moyenne') \
+                .stack().rename('Nombre de Candidats').reset_index()
+            donnees['Moyenne'] = donnees['Moyenne'].astype(str)
+            st.altair_chart(alt.Chart(donnees).mark_bar().encode(
+                x=alt.X('Moyenne:N', sort=[str(c) for c in histogrammes.columns], axis=alt.Axis(labelAngle=0)),
+                xOffset=f'{titre.capitalize()}:N',
+                y=alt.Y('Nombre de Candidats:Q'),
+                color=alt.Color(f'{titre.capitalize()}:N'),
+                tooltip=[titre.capitalize(), 'Moyenne', 'Nombre de Candidats']
+            ).properties(title=f'Histogramme des Moyennes par {titre.capitalize()}', height=300), use_container_width=True)
+    
+    def obtenir_rollups(self):
+        """Table de synthèse par vicariat, paroisse et grade, calculée une fois par version des résultats"""
+        empreinte = empreinte_resultats(self.df_resultats) + empreinte_resultats(
+            self.df_candidats[['matricule', 'vicariat', 'paroisse', 'grade']]
+        )
+        return calculer_rollups(self.df_resultats, self.df_candidats, empreinte)
+    
+    @st.fragment
+    def afficher_palmares(self):
+        """Afficher le palmarès des vicariats et paroisses avec détail par grade"""
+        st.subheader("🥇 Palmarès des Vicariats et Paroisses")
+        
+        if self.df_resultats.empty or 'moyenne' not in self.df_resultats.columns:
+            st.info("Aucun résultat disponible")
+            return
+        
+        rollups = self.obtenir_rollups()
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            niveau = st.radio(
+                "Niveau:", ['vicariat', 'paroisse'], format_func=str.capitalize,
+                horizontal=True, key=f"palmares_niveau_{self.activite}"
+            )
+        with col2:
+            critere = st.selectbox(
+                "Classer par:", ['Taux de réussite (%)', 'Moyenne', 'Participation (%)'],
+                key=f"palmares_critere_{self.activite}"
+            )
+        
+        palmares = classer_rollups(rollups, niveau, critere)
+        st.dataframe(palmares, use_container_width=True, hide_index=True)
+        
+        # Détail par grade de l'entité choisie, lu dans la même table de synthèse
+        colonne = 'Vicariat' if niveau == 'vicariat' else 'Paroisse'
+        entite = st.selectbox(f"Détail par grade — {colonne}:", palmares[colonne].tolist(), key=f"palmares_detail_{self.activite}")
+        detail = rollups[rollups[niveau] == entite].groupby('grade')[['inscrits', 'evalues', 'admis', 'somme_moyennes']].sum()
+        detail = detail.reindex([g for g in GRADES_ORDRE if g in detail.index])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            detail['Taux de réussite (%)'] = (detail['admis'] / detail['evalues'] * 100).round(1)
+            detail['Moyenne'] = (detail['somme_moyennes'] / detail['evalues']).round(2)
+            detail['Participation (%)'] = (detail['evalues'] / detail['inscrits'] * 100).round(1)
+        st.dataframe(
+            detail.drop(columns='somme_moyennes').rename(columns={'inscrits': 'Inscrits', 'evalues': 'Évalués', 'admis': 'Admis'}),
+            use_container_width=True
+        )
+    
+    def obtenir_simulateur(self):
+        """Simulateur de seuil construit une fois par version des résultats"""
+        empreinte = empreinte_resultats(self.df_resultats[['grade', 'vicariat', 'moyenne']])
+        cle = f'simulateur_{self.activite}'
+        if st.session_state.get(cle, (None, None))[0] != empreinte:
+            st.session_state[cle] = (empreinte, SimulateurSeuil(self.df_resultats))
+        return st.session_state[cle][1]
+    
+    @st.fragment
+    def afficher_simulateur_seuil(self):
+        """Simuler le nombre d'admis pour un autre seuil de réussite"""
+        st.subheader("🎚️ Simulation du Seuil de Réussite")
+        
+        if self.df_resultats.empty or 'moyenne' not in self.df_resultats.columns:
+            st.info("Aucun résultat disponible")
+            return
+        
+        simulateur = self.obtenir_simulateur()
+        seuil = st.slider(
+            "Seuil de réussite simulé:",
+            min_value=0.0, max_value=20.0, value=12.0, step=0.25,
+            key=f"seuil_simule_{self.activite}"
+        )
+        
+        par_grade = simulateur.admis_par_grade(seuil)
+        admis_actuels = self.df_resultats[self.df_resultats['decision'].isin(DECISIONS_ADMIS)].groupby('grade').size()
+        par_grade['Admis actuels'] = admis_actuels.reindex(par_grade.index).fillna(0).astype(int)
+        par_grade['Écart'] = par_grade['Admis'] - par_grade['Admis actuels']
+        
+        col1, col2, col3 = st.columns(3)
+        total_admis = int(par_grade['Admis'].sum())
+        total = int(par_grade['Effectif'].sum())
+        with col1:
+            st.metric("Admis au seuil simulé", total_admis, delta=int(par_grade['Écart'].sum()))
+        with col2:
+            st.metric("Taux de réussite simulé", f"{(total_admis / total * 100) if total else 0:.1f}%")
+        with col3:
+            st.metric("Seuil", f"{seuil:.2f}")
+        
+        st.write(f"**Admis par grade au seuil de {seuil:.2f}:**")
+        st.dataframe(par_grade, use_container_width=True)
+        
+        st.write("**Admis par grade et par vicariat:**")
+        par_vicariat = simulateur.compter_admis(seuil)
+        par_vicariat['Taux (%)'] = (par_vicariat['Admis'] / par_vicariat['Effectif'] * 100).round(1)
+        st.dataframe(
+            par_vicariat['Admis'].astype(str).str.cat(par_vicariat['Taux (%)'].astype(str), sep=' / ').add('%')
+            .unstack('vicariat').reindex([g for g in GRADES_ORDRE if g in par_grade.index]).fillna('-'),
+            use_container_width=True
+        )
+    
     def afficher_interpretation_statistiques(self, stats):
         """Afficher l'interprétation des statistiques en termes simples"""
         st.subheader("🎯 Interprétation des Résultats")
@@ -360,8 +913,9 @@ class TableauBordCompositions:
                 
                 st.write("---")
     
+    @st.fragment
     def afficher_classement(self):
-        """Afficher le classement général"""
+        """Afficher le classement général (fragment : les filtres ne relancent que le classement)"""
         st.subheader("🏆 Classement Général")
         
         if not self.df_resultats.empty and 'moyenne' in self.df_resultats.columns:
@@ -390,12 +944,14 @@ class TableauBordCompositions:
             with col1:
                 grade_selectionne = st.selectbox(
                     "Filtrer par grade:",
-                    ["Tous"] + list(df_classement['grade'].unique())
+                    ["Tous"] + list(df_classement['grade'].unique()),
+                    key=f"classement_grade_{self.activite}"
                 )
             with col2:
                 vicariat_selectionne = st.selectbox(
                     "Filtrer par vicariat:",
-                    ["Tous"] + list(df_classement['vicariat'].unique())
+                    ["Tous"] + list(df_classement['vicariat'].unique()),
+                    key=f"classement_vicariat_{self.activite}"
                 )
             
             if grade_selectionne != "Tous":
@@ -421,7 +977,8 @@ class TableauBordCompositions:
                 label="📥 Télécharger le classement",
                 data=csv_classement,
                 file_name=f"classement_{self.activite}_{datetime.now().year}.csv",
-                mime="text/csv"
+                mime="text/csv",
+                on_click="ignore"
             )
         else:
             st.info("Aucun résultat à afficher")
@@ -443,12 +1000,52 @@ class TableauBordCompositions:
                             'decision': lambda x: ((x == 'Admis') | (x == 'Admis_Passe au grade immédiatement supérieur')).sum()
                         }).round(2)
                         stats.to_excel(writer, sheet_name='Statistiques')
+                    
+                    # Analyse par composition
+                    if any(col in self.df_resultats.columns for col in COLONNES_COMPOS):
+                        analyse = AnalyseCompositions(self.df_resultats)
+                        analyse.statistiques().to_excel(writer, sheet_name='Compositions')
+                        analyse.correlations().to_excel(writer, sheet_name='Corrélations')
+                        analyse.moyennes_par_groupe('grade').to_excel(writer, sheet_name='Compositions par grade')
+                        analyse.moyennes_par_groupe('vicariat').to_excel(writer, sheet_name='Compositions par vicariat')
                 
                 return nom_fichier
         except Exception as e:
             st.error(f"Erreur lors de la génération du rapport: {e}")
             return None
 
+    def generer_packs_vicariats(self):
+        """Dossiers par vicariat (un PDF et un classeur chacun), rendus en parallèle et écrits au fil de l'eau dans une archive ZIP"""
+        import tempfile
+        import zipfile
+        import rendu_packs
+        
+        rollups = self.obtenir_rollups()
+        resultats = self.df_resultats.drop(columns=['vicariat', 'paroisse'], errors='ignore').merge(
+            self.df_candidats[['matricule', 'vicariat', 'paroisse']].drop_duplicates('matricule'), on='matricule', how='left'
+        )
+        resultats[['vicariat', 'paroisse']] = resultats[['vicariat', 'paroisse']].fillna(RegistreOrganisation.NON_SPECIFIE)
+        resultats['grade'] = pd.Categorical(resultats['grade'], categories=GRADES_ORDRE, ordered=True)
+        resultats = resultats.sort_values(['grade', 'rang', 'nom'])
+        resultats['grade'] = resultats['grade'].astype(str)
+        colonnes = ['grade'] + rendu_packs.COLONNES_RESULTATS + [col for col in COLONNES_COMPOS if col in resultats.columns]
+        
+        titre = "Week-end de Formation des Animateurs" if self.activite == "weekend" else "Session Diocésaine"
+        annee = datetime.now().year
+        taches = []
+        for vicariat, df_vicariat in resultats.groupby('vicariat', sort=True):
+            synthese = classer_rollups(rollups[rollups['vicariat'] == vicariat], 'paroisse', 'Taux de réussite (%)')
+            taches.append((vicariat, df_vicariat[colonnes], synthese.drop(columns='Vicariat'), titre, annee))
+        
+        # Archive sur disque : seuls les dossiers en cours de rendu sont en mémoire ; renvoie son chemin
+        with tempfile.NamedTemporaryFile(prefix=f"dossiers_vicariats_{self.activite}_", suffix='.zip', delete=False) as archive_fichier:
+            with zipfile.ZipFile(archive_fichier, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for vicariat, pdf, xlsx in executer_rendus(rendu_packs.rendre_pack, taches):
+                    nom = nom_fichier_sur(vicariat)
+                    archive.writestr(f"{nom}/resultats_{nom}.pdf", pdf)
+                    archive.writestr(f"{nom}/resultats_{nom}.xlsx", xlsx)
+        return archive_fichier.name
+    
     def generer_rapport_pdf(self):
         """Générer un rapport PDF complet avec graphiques"""
         try:
@@ -527,7 +1124,9 @@ class TableauBordCompositions:
                 fig2, ax2 = plt.subplots(figsize=(8, 6))
                 moyennes_par_grade = self.df_resultats.groupby('grade')['moyenne'].mean().round(2).reindex(GRADES_ORDRE)
                 bars = ax2.bar(moyennes_par_grade.index, moyennes_par_grade.values, color=colors_chart)
-                ax2.axhline(y=12, color='red', linestyle='--', alpha=0.7, label='Seuil de validation (12)')
+                seuils = [self.bareme.seuils_reussite.get(grade, np.nan) for grade in moyennes_par_grade.index]
+                positions = np.arange(len(seuils))
+                ax2.hlines(seuils, positions - 0.4, positions + 0.4, colors='red', linestyles='--', alpha=0.7, label='Seuil de validation')
                 ax2.set_title('Moyennes des Notes par Grade', fontsize=12, fontweight='bold')
                 ax2.set_ylabel('Moyenne')
                 ax2.legend()
@@ -541,6 +1140,47 @@ class TableauBordCompositions:
                     elements.append(Paragraph("Moyennes des Notes par Grade", styles['Heading3']))
                     elements.append(Image(tmp2.name, width=15*cm, height=10*cm))
                     elements.append(Spacer(1, 0.5*cm))
+                
+                # Graphique 3 et tableau : distribution des moyennes (mêmes calculs que le tableau de bord)
+                distributions = self.obtenir_distributions()
+                fig3, ax3 = plt.subplots(figsize=(10, 5))
+                distributions['histogrammes']['grade'].T.plot(kind='bar', ax=ax3, width=0.85, color=colors_chart)
+                ax3.set_title('Histogramme des Moyennes par Grade', fontsize=12, fontweight='bold')
+                ax3.set_xlabel('Moyenne')
+                ax3.set_ylabel('Nombre de Candidats')
+                ax3.legend(title='Grade')
+                plt.xticks(rotation=0)
+                
+                with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp3:
+                    plt.tight_layout()
+                    plt.savefig(tmp3.name, dpi=150, bbox_inches='tight')
+                    plt.close()
+                    
+                    elements.append(Paragraph("Distribution des Moyennes par Grade", styles['Heading3']))
+                    elements.append(Image(tmp3.name, width=16*cm, height=8*cm))
+                    elements.append(Spacer(1, 0.5*cm))
+                
+                percentiles = distributions['percentiles']['grade']
+                table_data_percentiles = [['Grade'] + list(percentiles.columns)]
+                for grade, ligne in percentiles.iterrows():
+                    table_data_percentiles.append(
+                        [grade, int(ligne['Effectif'])] + [f"{v:.2f}" if pd.notna(v) else "-" for v in ligne.iloc[1:]]
+                    )
+                table_percentiles = Table(table_data_percentiles)
+                table_percentiles.setStyle(TableStyle([
+                    ('BACKGROUND', (0, 0), (-1, 0), colors.gray),
+                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                    ('FONTSIZE', (0, 0), (-1, 0), 9),
+                    ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+                    ('FONTSIZE', (0, 1), (-1, -1), 8),
+                    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+                ]))
+                elements.append(Paragraph("Percentiles des Moyennes par Grade", styles['Heading3']))
+                elements.append(table_percentiles)
+                elements.append(Spacer(1, 0.5*cm))
         
         # RÉSULTATS PAR GRADE - CORRECTION CRITIQUE
             if not self.df_resultats.empty:
@@ -615,6 +1255,41 @@ class TableauBordCompositions:
             elements.append(table)
             elements.append(Spacer(1, 1*cm))
             
+            # ANALYSE PAR COMPOSITION
+            if any(col in self.df_resultats.columns for col in COLONNES_COMPOS):
+                analyse = AnalyseCompositions(self.df_resultats)
+                stats_compos = analyse.statistiques()
+                
+                elements.append(Paragraph("ANALYSE PAR COMPOSITION", styles['Heading3']))
+                table_data_compos = [['Composition', 'Effectif', 'Moyenne', 'Ecart-type', '% ≥ 10', 'Difficulté']]
+                for compo, ligne in stats_compos.iterrows():
+                    table_data_compos.append([
+                        compo, int(ligne['Effectif']), f"{ligne['Moyenne']:.2f}", f"{ligne['Ecart-type']:.2f}",
+                        f"{ligne['% ≥ 10']:.1f}%", f"{ligne['Difficulté']:.2f}"
+                    ])
+                
+                moyennes_grade = analyse.moyennes_par_groupe('grade')
+                table_data_grade = [['Grade'] + list(moyennes_grade.columns)]
+                for grade, ligne in moyennes_grade.iterrows():
+                    table_data_grade.append([grade] + [f"{v:.2f}" if pd.notna(v) else "-" for v in ligne])
+                
+                for donnees in [table_data_compos, table_data_grade]:
+                    table_compos = Table(donnees)
+                    table_compos.setStyle(TableStyle([
+                        ('BACKGROUND', (0, 0), (-1, 0), colors.gray),
+                        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                        ('FONTSIZE', (0, 0), (-1, 0), 9),
+                        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+                        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+                        ('FONTSIZE', (0, 1), (-1, -1), 8),
+                        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+                    ]))
+                    elements.append(table_compos)
+                    elements.append(Spacer(1, 0.5*cm))
+                elements.append(Spacer(1, 0.5*cm))
+            
             # NOUVELLE SECTION: RÉSULTATS PAR VICARIAT ET GRADE
             elements.append(Paragraph("RÉSULTATS DÉTAILLÉS PAR VICARIAT ET GRADE", styles['Heading3']))
             elements.append(Spacer(1, 0.5*cm))
@@ -719,14 +1394,109 @@ class TableauBordCompositions:
 
 # Le reste du code reste inchangé...
 
+class BaremeNotation:
+    """Barème de notation : coefficients des compositions, seuils de réussite par grade et seuils des mentions"""
+    
+    MENTIONS = {"T.Bien": 16, "Bien": 14, "A.Bien": 12}
+    MENTION_PAR_DEFAUT = "Passable"
+    
+    def __init__(self, coefficients=None, seuils_reussite=None, seuil_reussite=12, seuils_mentions=None):
+        self.coefficients = {col: 1.0 for col in COLONNES_COMPOS}
+        self.coefficients.update(coefficients or {})
+        self.seuils_reussite = {grade: float(seuil_reussite) for grade in GRADES_ORDRE}
+        self.seuils_reussite.update(seuils_reussite or {})
+        self.seuils_mentions = dict(seuils_mentions or self.MENTIONS)
+    
+    @classmethod
+    def depuis_base(cls, chemin_base=CHEMIN_BASE):
+        """Charger les coefficients depuis la table matieres (COMP1..COMP5 -> COMPO1..COMPO5)"""
+        try:
+            with connexion_base(chemin_base) as conn:
+                matieres = conn.execute("SELECT code_matiere, coefficient FROM matieres").fetchall()
+        except sqlite3.Error:
+            return cls()
+        
+        coefficients = {}
+        for code, coefficient in matieres:
+            col = f"COMPO{''.join(c for c in code if c.isdigit())}"
+            if col in COLONNES_COMPOS and coefficient is not None:
+                coefficients[col] = float(coefficient)
+        return cls(coefficients=coefficients)
+    
+    def enregistrer_coefficients(self, chemin_base=CHEMIN_BASE):
+        """Enregistrer les coefficients dans la table matieres"""
+        with connexion_base(chemin_base) as conn, conn:
+            conn.executemany(
+                "INSERT INTO matieres (code_matiere, libelle, coefficient) VALUES (?, ?, ?) "
+                "ON CONFLICT(code_matiere) DO UPDATE SET coefficient = excluded.coefficient",
+                [(col.replace('COMPO', 'COMP'), f"Composition {col[-1]}", coefficient)
+                 for col, coefficient in self.coefficients.items()]
+            )
+    
+    def signature(self):
+        """Identifiant du barème (clé de cache des résultats proclamés)"""
+        return repr((sorted(self.coefficients.items()), sorted(self.seuils_reussite.items()), sorted(self.seuils_mentions.items())))
+    
+    def vecteur_coefficients(self):
+        """Coefficients dans l'ordre COMPO1..COMPO5"""
+        return np.array([self.coefficients[col] for col in COLONNES_COMPOS], dtype=np.float64)
+    
+    def calculer_moyennes(self, matrice):
+        """Moyennes pondérées (compositions absentes ignorées) : un seul produit matrice-vecteur"""
+        matrice = np.asarray(matrice, dtype=np.float64)
+        presentes = ~np.isnan(matrice)
+        poids = self.vecteur_coefficients()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            moyennes = (np.where(presentes, matrice, 0) @ poids) / (presentes @ poids)
+        return np.round(moyennes, 2)
+    
+    def mentions(self, moyennes):
+        """Mentions selon les seuils du barème"""
+        seuils = sorted(self.seuils_mentions.items(), key=lambda item: item[1], reverse=True)
+        return np.select(
+            [moyennes >= seuil for _, seuil in seuils],
+            [mention for mention, _ in seuils],
+            default=self.MENTION_PAR_DEFAUT
+        )
+    
+    def decisions(self, moyennes, grades):
+        """Décisions selon le seuil de réussite du grade de chaque candidat"""
+        seuils = pd.Series(grades).map(self.seuils_reussite).fillna(max(self.seuils_reussite.values())).to_numpy()
+        admis = moyennes >= seuils
+        # Dernier grade : juste "Admis" ; sinon passage au grade supérieur ; sinon redoublement
+        return np.where(
+            admis,
+            np.where(np.asarray(grades) == GRADES_ORDRE[-1], "Admis", "Admis_Passe au grade immédiatement supérieur"),
+            "Échec"
+        )
+
 class CorrecteurCompositions:
-    def __init__(self, activite):
-        self.seuil_reussite = 12
-        self.seuil_excellence = 16
+    # Politiques de classement des ex aequo
+    MODES_CLASSEMENT = {
+        'ex aequo': "Ex aequo (même rang, rangs suivants sautés : 1, 1, 3)",
+        'dense': "Rang dense (même rang, sans saut : 1, 1, 2)",
+        'départage': "Départage par les compositions (COMPO1 puis COMPO2...)"
+    }
+    
+    # Note retenue lorsque les correcteurs s'écartent de plus que la tolérance
+    POLITIQUES_DESACCORD = {
+        'moyenne': "Moyenne des correcteurs (écart signalé)",
+        'maximum': "Note la plus favorable",
+        'arbitrage': "Note écartée, à arbitrer par un troisième correcteur"
+    }
+    
+    def __init__(self, activite, bareme=None, mode_classement='ex aequo'):
+        if mode_classement not in self.MODES_CLASSEMENT:
+            raise ValueError(f"Mode de classement inconnu: {mode_classement}")
+        self.mode_classement = mode_classement
+        self.bareme = bareme or BaremeNotation()
         self.activite = activite
+        self.journal = JournalImport()
     
-    def importer_notes(self, fichier_notes):
+    def importer_notes(self, fichier_notes, df_candidats=None):
         """Importer le fichier Excel des notes avec TOUTES les feuilles"""
+        self.anomalies_notes = pd.DataFrame(columns=self.COLONNES_ANOMALIES)
+        self.journal = JournalImport()
         try:
             # Augmenter la capacité d'importation
             import warnings
@@ -735,106 +1505,377 @@ class CorrecteurCompositions:
             # Lire toutes les feuilles
             excel_file = pd.ExcelFile(fichier_notes)
             all_sheets_data = []
+            index_noms = None
             
             for sheet_name in excel_file.sheet_names:
                 try:
-                    # Utiliser des paramètres optimisés pour les gros fichiers
-                    notes_df = pd.read_excel(
-                        fichier_notes, 
+                    # Ne lire que les colonnes utiles (en-têtes résolus par le schéma des notes)
+                    notes_df, _ = lire_tableau(
+                        excel_file,
+                        SCHEMA_NOTES,
                         sheet_name=sheet_name,
-                        engine='openpyxl',
-                        dtype={'matricule': str}  # Forcer le matricule en texte
+                        dtypes=TYPES_NOTES  # Matricule en texte, compositions en réels
                     )
+                    notes_df['ligne'] = notes_df.index + 2  # Numéro de ligne Excel (en-tête en ligne 1)
                     
-                    # Nettoyer les noms de colonnes
-                    notes_df.columns = notes_df.columns.str.strip()
+                    # Feuille identifiée par nom/prénom : retrouver les matricules
+                    if ('matricule' not in notes_df.columns
+                            and {'nom', 'prenom'}.issubset(notes_df.columns)
+                            and df_candidats is not None):
+                        if 'grade' not in notes_df.columns:
+                            notes_df['grade'] = sheet_name if sheet_name in GRADES_ORDRE else None
+                        if index_noms is None:
+                            index_noms = self.construire_index_noms(df_candidats)
+                        notes_df = self.lier_notes_avec_matricules(notes_df, df_candidats, index_noms)
                     
                     # Vérifier les colonnes requises
-                    colonnes_requises = ['matricule', 'COMPO1', 'COMPO2', 'COMPO3', 'COMPO4', 'COMPO5']
+                    colonnes_requises = ['matricule'] + COLONNES_COMPOS
                     colonnes_presentes = [col for col in colonnes_requises if col in notes_df.columns]
                     
-                    if len(colonnes_presentes) >= 2:  # Au moins matricule et une note
-                        # Nettoyer les données
-                        notes_df = notes_df.dropna(subset=['matricule'])
-                        notes_df['matricule'] = notes_df['matricule'].astype(str).str.strip()
-                        
-                        # Calculer la moyenne des compositions disponibles
-                        colonnes_notes = [col for col in ['COMPO1', 'COMPO2', 'COMPO3', 'COMPO4', 'COMPO5'] if col in notes_df.columns]
-                        
-                        # Convertir les notes en numérique, gérer les erreurs
-                        for col in colonnes_notes:
-                            notes_df[col] = pd.to_numeric(notes_df[col], errors='coerce')
-                        
-                        notes_df['note'] = notes_df[colonnes_notes].mean(axis=1).round(2)
-                        
-                        # Filtrer les lignes avec des notes valides
-                        notes_df = notes_df.dropna(subset=['note'])
-                        
-                        if not notes_df.empty:
-                            all_sheets_data.append(notes_df[['matricule', 'note']])
-                            st.success(f"✅ Feuille '{sheet_name}' importée: {len(notes_df)} notes valides")
-                        else:
-                            st.warning(f"⚠️ Feuille '{sheet_name}' ignorée: aucune note valide")
+                    if 'matricule' in colonnes_presentes and len(colonnes_presentes) >= 2:  # Au moins matricule et une note
+                        # Conserver les cellules brutes : la validation et la conversion se font sur toutes les feuilles à la fois
+                        notes_df = notes_df.reindex(columns=['matricule', 'ligne', 'liaison'] + COLONNES_COMPOS)
+                        notes_df['feuille'] = sheet_name
+                        all_sheets_data.append(notes_df)
                     else:
-                        st.warning(f"⚠️ Feuille '{sheet_name}' ignorée: colonnes insuffisantes")
+                        self.journal.warning(f"⚠️ Feuille '{sheet_name}' ignorée: colonnes insuffisantes")
                         
                 except Exception as e:
-                    st.warning(f"⚠️ Erreur avec la feuille '{sheet_name}': {str(e)}")
+                    self.journal.warning(f"⚠️ Erreur avec la feuille '{sheet_name}': {str(e)}")
             
             if all_sheets_data:
-                # Combiner toutes les données
+                # Combiner toutes les données, puis valider et convertir en une passe
                 combined_df = pd.concat(all_sheets_data, ignore_index=True)
+                combined_df, self.anomalies_notes = self.valider_notes(combined_df, df_candidats)
+                
+                # Calculer la moyenne des compositions disponibles
+                combined_df['note'] = combined_df[COLONNES_COMPOS].mean(axis=1).round(2)
                 
-                # Supprimer les doublons (garder la dernière occurrence)
+                # Filtrer les lignes avec des notes valides
+                combined_df = combined_df.dropna(subset=['note'])
+                
+                for sheet_name, nombre in combined_df['feuille'].value_counts(sort=False).items():
+                    self.journal.success(f"✅ Feuille '{sheet_name}' importée: {nombre} notes valides")
+                for sheet_name in {d['feuille'].iloc[0] for d in all_sheets_data} - set(combined_df['feuille']):
+                    self.journal.warning(f"⚠️ Feuille '{sheet_name}' ignorée: aucune note valide")
+                
+                # Supprimer les doublons (garder la dernière occurrence, signalée dans le rapport d'anomalies)
                 combined_df = combined_df.drop_duplicates(subset=['matricule'], keep='last')
                 
-                st.success(f"🎉 Import terminé: {len(combined_df)} notes uniques provenant de {len(all_sheets_data)} feuille(s)")
+                # Conserver la matrice des compositions (float32, compositions absentes à NaN)
+                combined_df[COLONNES_COMPOS] = combined_df[COLONNES_COMPOS].astype(np.float32)
+                combined_df = combined_df[['matricule'] + COLONNES_COMPOS + ['note']].reset_index(drop=True)
+                
+                if combined_df.empty:
+                    self.journal.error("❌ Aucune donnée valide trouvée dans le fichier")
+                    return pd.DataFrame()
+                
+                self.journal.success(f"🎉 Import terminé: {len(combined_df)} notes uniques provenant de {len(all_sheets_data)} feuille(s)")
                 return combined_df
             else:
-                st.error("❌ Aucune donnée valide trouvée dans le fichier")
+                self.journal.error("❌ Aucune donnée valide trouvée dans le fichier")
                 return pd.DataFrame()
             
         except Exception as e:
-            st.error(f"Erreur lors de l'importation du fichier: {str(e)}")
+            self.journal.error(f"Erreur lors de l'importation du fichier: {str(e)}")
             import traceback
-            st.error(f"Détails: {traceback.format_exc()}")
+            self.journal.error(f"Détails: {traceback.format_exc()}")
             return pd.DataFrame()
     
+    COLONNES_ANOMALIES = ['feuille', 'ligne', 'matricule', 'colonne', 'valeur', 'anomalie']
+    
+    def valider_notes(self, notes_brutes, df_candidats=None, note_min=0, note_max=20):
+        """Valider toutes les feuilles en une passe vectorisée et convertir les notes (anomalies exclues)"""
+        notes_df = notes_brutes.copy()
+        notes_df['matricule'] = notes_df['matricule'].astype('string').str.strip().replace('', pd.NA)
+        anomalies = []
+        
+        def signaler(masque, anomalie, colonne=None, valeurs=None):
+            """Ajouter au rapport les lignes d'un masque booléen"""
+            if not masque.any():
+                return
+            lignes = notes_df.loc[masque, ['feuille', 'ligne', 'matricule']].copy()
+            lignes['colonne'] = colonne
+            lignes['valeur'] = valeurs[masque] if valeurs is not None else None
+            lignes['anomalie'] = anomalie
+            anomalies.append(lignes)
+        
+        # Cellules de notes : non numériques, hors barème
+        # Colonnes déjà typées à la lecture : aucune conversion ; sinon conversion tolérante cellule par cellule
+        brutes = notes_df[COLONNES_COMPOS]
+        converties = pd.DataFrame(index=notes_df.index)
+        non_numeriques = pd.DataFrame(False, index=notes_df.index, columns=COLONNES_COMPOS)
+        for col in COLONNES_COMPOS:
+            if pd.api.types.is_numeric_dtype(brutes[col]):
+                converties[col] = brutes[col].astype(np.float64)
+            else:
+                valeurs = brutes[col].replace(r'^\s*$', np.nan, regex=True)
+                converties[col] = pd.to_numeric(valeurs, errors='coerce')
+                non_numeriques[col] = valeurs.notna() & converties[col].isna()
+        hors_bornes = (converties < note_min) | (converties > note_max)
+        for col in COLONNES_COMPOS:
+            signaler(non_numeriques[col], "Valeur non numérique", col, brutes[col].astype(str))
+            signaler(hors_bornes[col], f"Note hors barème ({note_min}-{note_max})", col, converties[col])
+        notes_df[COLONNES_COMPOS] = converties.mask(hors_bornes)
+        
+        # Lignes : matricule manquant, aucune note
+        sans_matricule = notes_df['matricule'].isna()
+        signaler(sans_matricule & converties.notna().any(axis=1), "Matricule manquant")
+        sans_note = notes_df[COLONNES_COMPOS].isna().all(axis=1)
+        signaler(~sans_matricule & sans_note, "Aucune note valide")
+        # Écartées avant la recherche des doublons : l'occurrence signalée comme écartée est bien celle qui l'est
+        notes_df = notes_df[~sans_matricule & ~sans_note]
+        
+        # Matricules inconnus ou placés dans la feuille d'un autre grade
+        if df_candidats is not None and 'matricule' in df_candidats.columns:
+            grades_candidats = df_candidats.drop_duplicates('matricule').set_index('matricule')['grade']
+            grade_reel = notes_df['matricule'].map(grades_candidats)
+            signaler(grade_reel.isna(), "Matricule inconnu")
+            mauvaise_feuille = notes_df['feuille'].isin(GRADES_ORDRE) & grade_reel.notna() & (grade_reel != notes_df['feuille'])
+            signaler(mauvaise_feuille, "Feuille d'un autre grade", 'grade', grade_reel)
+        
+        # Correspondances approchées tombant sur un matricule déjà noté : aucune n'est retenue au hasard
+        if 'liaison' in notes_df.columns:
+            conflit = notes_df['liaison'].isin(['approché', 'inversé']) & notes_df['matricule'].duplicated(keep=False)
+            signaler(conflit, "Correspondance approchée en conflit avec une autre ligne (ligne écartée)")
+            notes_df = notes_df[~conflit]
+        
+        # Doublons entre feuilles (la dernière occurrence est retenue)
+        doublons = notes_df['matricule'].duplicated(keep=False)
+        if doublons.any():
+            empreintes = pd.util.hash_pandas_object(notes_df[COLONNES_COMPOS], index=False)
+            notes_differentes = empreintes.groupby(notes_df['matricule']).transform('nunique') > 1
+            ecartee = notes_df['matricule'].duplicated(keep='last')
+            signaler(doublons & notes_differentes & ecartee, "Doublon avec notes différentes (occurrence écartée)")
+            signaler(doublons & ~notes_differentes & ecartee, "Doublon identique (occurrence écartée)")
+        
+        rapport = pd.concat(anomalies, ignore_index=True) if anomalies else pd.DataFrame(columns=self.COLONNES_ANOMALIES)
+        rapport = rapport[self.COLONNES_ANOMALIES].sort_values(['feuille', 'ligne'], kind='mergesort').reset_index(drop=True)
+        return notes_df, rapport
+    
+    def construire_index_noms(self, df_candidats):
+        """Construire l'index de blocage {grade: {nom normalisé: matricule}}"""
+        cles = normaliser_serie(df_candidats['nom']) + ' ' + normaliser_serie(df_candidats['prenom'])
+        index_noms = {}
+        for grade, cle, matricule in zip(df_candidats['grade'], cles, df_candidats['matricule']):
+            bloc = index_noms.setdefault(grade, {})
+            # Deux candidats homonymes dans un même grade : lien ambigu
+            bloc[cle] = None if cle in bloc and bloc[cle] != matricule else matricule
+        return index_noms
+    
+    @staticmethod
+    def indexer_bloc(bloc):
+        """Clés d'un bloc et leurs histogrammes de caractères (filtre vectorisé avant la distance d'édition)"""
+        paires = list(bloc.items())
+        histogrammes = np.zeros((len(paires), 128), dtype=np.int16)
+        for i, (cle, _) in enumerate(paires):
+            histogrammes[i] = histogramme_caracteres(cle)
+        # Ne garder que les caractères présents dans le bloc
+        caracteres = np.flatnonzero(histogrammes.any(axis=0))
+        longueurs = histogrammes.sum(axis=1)
+        return paires, histogrammes[:, caracteres], caracteres, longueurs
+    
+    def rechercher_matricule(self, cle, bloc, distance_max=2, index_bloc=None):
+        """Rechercher un matricule dans un bloc : exact, nom/prénom inversés, puis distance d'édition"""
+        if cle in bloc:
+            return (bloc[cle], 'exact') if bloc[cle] else (None, None)
+        
+        mots = cle.split(' ')
+        for i in range(1, len(mots)):
+            cle_inversee = ' '.join(mots[i:] + mots[:i])
+            if bloc.get(cle_inversee):
+                return bloc[cle_inversee], 'inversé'
+        
+        # Tolérance proportionnelle à la longueur (une faute par tranche de 6 caractères) : « adjo jeanne » ne rejoint pas « adjo jean »
+        distance_max = min(distance_max, len(cle) // 6)
+        if distance_max == 0:
+            return None, None
+        
+        # Chaque opération d'édition retire au plus un caractère en trop et ajoute au plus un caractère manquant :
+        # (écart des histogrammes + écart des longueurs) / 2 minore la distance
+        if index_bloc is None:
+            voisines = bloc.items()
+        else:
+            paires, histogrammes, caracteres, longueurs = index_bloc
+            histogramme = histogramme_caracteres(cle).astype(np.int16)
+            hors_bloc = histogramme.sum() - histogramme[caracteres].sum()
+            ecart = np.abs(histogrammes - histogramme[caracteres]).sum(axis=1) + hors_bloc
+            minorants = (ecart + np.abs(longueurs - len(cle))) / 2
+            voisines = [paires[i] for i in np.flatnonzero(minorants <= distance_max)]
+        meilleure_distance = distance_max + 1
+        meilleurs = []
+        for cle_candidat, matricule in voisines:
+            distance = distance_edition(cle, cle_candidat, meilleure_distance)
+            if distance < meilleure_distance:
+                meilleure_distance = distance
+                meilleurs = [matricule]
+            elif distance == meilleure_distance and distance <= distance_max:
+                meilleurs.append(matricule)
+        
+        # Ne retenir une correspondance approchée que si elle est unique
+        if len(meilleurs) == 1 and meilleurs[0] is not None:
+            return meilleurs[0], 'approché'
+        return None, None
+    
+    def lier_notes_avec_matricules(self, notes_df, df_candidats, index_noms=None, distance_max=2):
+        """Faire le lien entre nom/prénom et matricule (blocage par grade + distance d'édition)"""
+        if index_noms is None:
+            index_noms = self.construire_index_noms(df_candidats)
+        
+        # Bloc global pour les lignes sans grade connu
+        bloc_global = {}
+        for bloc in index_noms.values():
+            for cle, matricule in bloc.items():
+                bloc_global[cle] = None if cle in bloc_global and bloc_global[cle] != matricule else matricule
+        
+        notes_df = notes_df.copy()
+        cles = normaliser_serie(notes_df['nom']) + ' ' + normaliser_serie(notes_df['prenom'])
+        grades = notes_df['grade'] if 'grade' in notes_df.columns else pd.Series(None, index=notes_df.index)
+        
+        matricules = []
+        methodes = []
+        index_blocs = {}
+        for cle, grade in zip(cles, grades):
+            nom_bloc = grade if isinstance(grade, str) and grade in index_noms else None
+            bloc = index_noms[nom_bloc] if nom_bloc is not None else bloc_global
+            if nom_bloc not in index_blocs:
+                index_blocs[nom_bloc] = self.indexer_bloc(bloc)
+            matricule, methode = self.rechercher_matricule(cle, bloc, distance_max, index_blocs[nom_bloc])
+            matricules.append(matricule)
+            methodes.append(methode)
+        
+        notes_df['matricule'] = matricules
+        notes_df['liaison'] = methodes
+        
+        approches = notes_df[notes_df['liaison'].isin(['approché', 'inversé'])]
+        if not approches.empty:
+            noms_candidats = df_candidats.drop_duplicates('matricule').set_index('matricule')
+            apercu = approches[['nom', 'prenom', 'matricule']].copy()
+            apercu['nom_candidat'] = apercu['matricule'].map(noms_candidats['nom'])
+            apercu['prenom_candidat'] = apercu['matricule'].map(noms_candidats['prenom'])
+            self.journal.info(f"🔎 {len(approches)} note(s) liée(s) par correspondance approchée")
+            self.journal.dataframe(apercu)
+        
+        notes_sans_matricule = notes_df[notes_df['matricule'].isna()]
+        if not notes_sans_matricule.empty:
+            self.journal.warning(f"⚠️ {len(notes_sans_matricule)} note(s) sans candidat correspondant")
+            self.journal.dataframe(notes_sans_matricule[['nom', 'prenom', 'grade']])
+        
+        notes_valides = notes_df.dropna(subset=['matricule'])
+        self.journal.info(f"✅ {len(notes_valides)} note(s) liée(s) avec succès sur {len(notes_df)}")
+        
+        return notes_valides
+    
+    def importer_double_correction(self, fichiers_notes, df_candidats=None, tolerance=1.0, politique='moyenne'):
+        """Importer les classeurs de plusieurs correcteurs puis rapprocher leurs notes"""
+        noms = [f.name for f in fichiers_notes]
+        if len(set(noms)) < len(noms):
+            noms = [f"{i} - {nom}" for i, nom in enumerate(noms, 1)]
+        
+        notes_correcteurs, anomalies, journal = {}, [], JournalImport()
+        for nom, fichier in zip(noms, fichiers_notes):
+            notes_correcteurs[nom] = self.importer_notes(fichier, df_candidats)
+            journal.write(f"**Classeur {nom}**")
+            journal.etendre(self.journal)
+            if not self.anomalies_notes.empty:
+                anomalies.append(self.anomalies_notes.assign(feuille=nom + " / " + self.anomalies_notes['feuille'].astype(str)))
+        self.journal = journal
+        self.anomalies_notes = pd.concat(anomalies, ignore_index=True) if anomalies else pd.DataFrame(columns=self.COLONNES_ANOMALIES)
+        
+        return self.rapprocher_notes(notes_correcteurs, tolerance, politique)
+    
+    def rapprocher_notes(self, notes_correcteurs, tolerance=1.0, politique='moyenne'):
+        """Aligner les notes {correcteur: notes} par matricule et composition en une jointure : (notes retenues, écarts)"""
+        # Un classeur sans note exploitable ne compte pas comme correcteur
+        correcteurs = [nom for nom, notes in notes_correcteurs.items() if not notes.empty]
+        for nom in notes_correcteurs:
+            if nom not in correcteurs:
+                self.journal.warning(f"⚠️ Classeur {nom}: aucune note exploitable, écarté du rapprochement")
+        if not correcteurs:
+            return pd.DataFrame(), pd.DataFrame()
+        if len(correcteurs) == 1:
+            self.journal.warning("⚠️ Un seul classeur exploitable : notes reprises sans double correction")
+        feuilles = [notes_correcteurs[nom][['matricule'] + COLONNES_COMPOS].assign(correcteur=nom) for nom in correcteurs]
+        
+        # Alignement en une passe : cube (matricule, composition, correcteur), cellules non corrigées à NaN
+        toutes = pd.concat(feuilles, ignore_index=True)
+        codes, matricules = pd.factorize(toutes['matricule'])
+        numeros = toutes['correcteur'].map({nom: i for i, nom in enumerate(correcteurs)}).to_numpy()
+        cube = np.full((len(matricules), len(COLONNES_COMPOS), len(correcteurs)), np.nan)
+        cube[codes, :, numeros] = toutes[COLONNES_COMPOS].to_numpy(dtype=np.float64)
+        
+        nombre = (~np.isnan(cube)).sum(axis=2)
+        plus_haute = np.fmax.reduce(cube, axis=2)
+        ecart = plus_haute - np.fmin.reduce(cube, axis=2)
+        desaccord = ecart > tolerance + 1e-9
+        with np.errstate(invalid='ignore'):
+            retenue = np.nansum(cube, axis=2) / nombre
+        # La politique ne tranche que les cellules en désaccord : ailleurs, moyenne des correcteurs
+        if politique == 'maximum':
+            retenue = np.where(desaccord, plus_haute, retenue)
+        elif politique == 'arbitrage':
+            retenue = np.where(desaccord, np.nan, retenue)
+        retenue = np.round(retenue, 2)
+        en_attente = desaccord if politique == 'arbitrage' else np.zeros_like(desaccord)
+        
+        # Rapport : cellules en désaccord ou corrigées par un seul correcteur
+        a_verifier = desaccord | ((nombre > 0) & (nombre < len(correcteurs)))
+        lignes, colonnes = np.nonzero(a_verifier)
+        ecarts = pd.DataFrame({'matricule': matricules[lignes], 'composition': np.array(COLONNES_COMPOS)[colonnes]})
+        for i, nom in enumerate(correcteurs):
+            ecarts[nom] = cube[lignes, colonnes, i]
+        ecarts['ecart'] = ecart[lignes, colonnes]
+        ecarts['note_retenue'] = retenue[lignes, colonnes]
+        ecarts['statut'] = np.select(
+            [en_attente[lignes, colonnes], desaccord[lignes, colonnes]],
+            [DECISION_ARBITRAGE, f"Écart supérieur à {tolerance:g} point(s)"],
+            "Corrigée par un seul correcteur"
+        )
+        
+        # Retour au format d'importer_notes : une ligne par candidat, compositions en colonnes
+        notes_df = pd.DataFrame(retenue.astype(np.float32), columns=COLONNES_COMPOS)
+        notes_df.insert(0, 'matricule', matricules)
+        notes_df['note'] = notes_df[COLONNES_COMPOS].mean(axis=1).round(2)
+        # Compositions à arbitrer par candidat : le candidat reste hors classement tant qu'elles ne sont pas saisies
+        arbitrage = np.full(len(notes_df), '', dtype=object)
+        for ligne in np.nonzero(en_attente.any(axis=1))[0]:
+            arbitrage[ligne] = ', '.join(np.array(COLONNES_COMPOS)[en_attente[ligne]])
+        notes_df['arbitrage'] = arbitrage
+        notes_df = notes_df[notes_df['note'].notna() | (notes_df['arbitrage'] != '')].reset_index(drop=True)
+        
+        self.journal.success(f"🤝 Rapprochement terminé: {len(notes_df)} candidats, {int(desaccord.sum())} note(s) en désaccord sur {int((nombre > 0).sum())}")
+        candidats_en_attente = int((notes_df['arbitrage'] != '').sum())
+        if candidats_en_attente:
+            self.journal.warning(
+                f"⚖️ {candidats_en_attente} candidat(s) en attente d'arbitrage : ni moyenne ni rang tant que la note arbitrée n'est pas saisie dans la grille"
+            )
+        return notes_df, ecarts
+    
     def calculer_moyennes(self, notes_df):
         """Calculer les moyennes pour chaque candidat"""
         if notes_df.empty:
             return pd.DataFrame()
         
-        # Grouper par matricule et calculer la moyenne
-        moyennes_df = notes_df.groupby('matricule').agg({
-            'note': 'mean'
-        }).round(2).reset_index()
+        # Grouper par matricule et calculer la moyenne (les compositions suivent)
+        colonnes = ['note'] + [col for col in COLONNES_COMPOS if col in notes_df.columns]
+        moyennes_df = notes_df.groupby('matricule')[colonnes].mean().reset_index()
+        moyennes_df['note'] = moyennes_df['note'].round(2)
         
         return moyennes_df
     
     def determiner_mention(self, moyenne):
-        """Déterminer la mention selon la moyenne (NOUVEAU BARÈME)"""
-        if moyenne >= 16:
-            return "T.Bien"
-        elif moyenne >= 14:
-            return "Bien"
-        elif moyenne >= 12:
-            return "A.Bien"
-        else:
-            return "Passable"
+        """Déterminer la mention selon la moyenne (barème en vigueur)"""
+        return self.bareme.mentions(np.array([moyenne]))[0]
     
     def determiner_decision(self, moyenne, grade):
-        """Déterminer la décision selon la moyenne et le grade (NOUVEAU BARÈME)"""
-        if moyenne >= self.seuil_reussite:
-            if grade == 'Formation 2':
-                return "Admis"  # Dernier grade, juste "Admis"
-            else:
-                return "Admis_Passe au grade immédiatement supérieur"
-        else:
-            return "Échec"  # Redouble
+        """Déterminer la décision selon la moyenne et le grade (barème en vigueur)"""
+        return self.bareme.decisions(np.array([moyenne]), np.array([grade]))[0]
     
     def proclamer_resultats(self, notes_df, df_candidats):
         """Proclamer les résultats avec classement PAR GRADE"""
+        if 'arbitrage' in notes_df.columns:
+            # Pas de moyenne partielle : les candidats en attente d'arbitrage sont proclamés une fois leurs notes saisies
+            notes_df = notes_df[notes_df['arbitrage'] == '']
         if notes_df.empty:
             return pd.DataFrame()
         
@@ -849,41 +1890,67 @@ class CorrecteurCompositions:
             on='matricule',
             how='left'
         )
-            
-        resultats = []
+        resultats_df = resultats_df[resultats_df['grade'].isin(GRADES_ORDRE)]
         
-        for grade in GRADES_ORDRE:
-            if grade in resultats_df['grade'].unique():
-                df_grade = resultats_df[resultats_df['grade'] == grade].copy()
-                df_grade = df_grade.sort_values('note', ascending=False)
-                df_grade['rang'] = range(1, len(df_grade) + 1)
-                
-                for _, row in df_grade.iterrows():
-                    mention = self.determiner_mention(row['note'])
-                    decision = self.determiner_decision(row['note'], row['grade'])
-                    
-                    resultats.append({
-                        'matricule': row['matricule'],
-                        'nom': row['nom'],
-                        'prenom': row['prenom'],
-                        'grade': grade,
-                        'vicariat': row['vicariat'],
-                        'moyenne': row['note'],
-                        'rang': int(row['rang']),
-                        'mention': mention,
-                        'decision': decision
-                    })
-        
-        return pd.DataFrame(resultats)
+        return self.appliquer_bareme(resultats_df)
     
-    def afficher_analyse_notes(self, notes_df):
-        """Afficher une analyse détaillée des notes"""
-        if notes_df.empty:
-            return
+    def appliquer_bareme(self, resultats_df):
+        """Calculer moyennes pondérées, rangs, mentions et décisions en une passe vectorisée"""
+        if resultats_df.empty:
+            return pd.DataFrame()
+        
+        df = resultats_df.copy()
+        for col in COLONNES_COMPOS:
+            if col not in df.columns:
+                df[col] = np.nan
+        df[COLONNES_COMPOS] = df[COLONNES_COMPOS].astype(np.float32)
+        
+        df['moyenne'] = self.bareme.calculer_moyennes(df[COLONNES_COMPOS].to_numpy())
+        if 'note' in df.columns:
+            # Repli sur la note déjà calculée si aucune composition n'est disponible
+            df['moyenne'] = df['moyenne'].fillna(df['note'])
+        
+        df['rang'] = self.calculer_rangs(df)
+        df['grade'] = pd.Categorical(df['grade'], categories=GRADES_ORDRE, ordered=True)
+        df = df.sort_values(['grade', 'rang', 'matricule'], kind='mergesort')
+        df['grade'] = df['grade'].astype(str)
+        
+        df['mention'] = self.bareme.mentions(df['moyenne'].to_numpy())
+        df['decision'] = self.bareme.decisions(df['moyenne'].to_numpy(), df['grade'].to_numpy())
+        
+        colonnes = ['matricule', 'nom', 'prenom', 'grade', 'vicariat'] + COLONNES_COMPOS + ['moyenne', 'rang', 'mention', 'decision']
+        return df[colonnes].reset_index(drop=True)
+
+    def calculer_rangs(self, df):
+        """Rangs au sein de chaque grade selon le mode de classement (calcul vectorisé et déterministe)"""
+        if self.mode_classement == 'ex aequo':
+            return df.groupby('grade')['moyenne'].rank(method='min', ascending=False).astype(int)
+        if self.mode_classement == 'dense':
+            return df.groupby('grade')['moyenne'].rank(method='dense', ascending=False).astype(int)
+        
+        # Départage : moyenne puis COMPO1..COMPO5 ; seules les égalités sur toutes les clés restent ex aequo
+        cles = ['moyenne'] + COLONNES_COMPOS
+        valeurs = df[cles].fillna(-1)
+        ordre = pd.concat([df[['grade']], valeurs], axis=1).sort_values(
+            ['grade'] + cles, ascending=[True] + [False] * len(cles), kind='mergesort'
+        )
+        nouveau_bloc = (ordre.ne(ordre.shift())).any(axis=1)
+        positions = ordre.groupby('grade').cumcount() + 1
+        rangs = positions.where(nouveau_bloc).ffill().astype(int)
+        return rangs.reindex(df.index)
+    
+    def afficher_analyse_notes(self, notes_df):
+        """Afficher une analyse détaillée des notes"""
+        if notes_df.empty:
+            return
         
         st.subheader("📈 Analyse Détaillée des Notes")
         
-        stats = notes_df['note'].describe()
+        # Moyennes pondérées du barème, comme à la proclamation
+        moyennes = pd.Series(self.bareme.calculer_moyennes(notes_df[COLONNES_COMPOS].to_numpy()), index=notes_df.index)
+        if 'note' in notes_df.columns:
+            moyennes = moyennes.fillna(notes_df['note'])
+        stats = moyennes.describe()
         
         col1, col2, col3, col4 = st.columns(4)
         
@@ -901,12 +1968,14 @@ class CorrecteurCompositions:
         moyenne = stats['mean']
         mediane = stats['50%']
         ecart_type = stats['std']
+        seuil_reussite = min(self.bareme.seuils_reussite.values())
+        seuil_bien = self.bareme.seuils_mentions.get("Bien", 14)
         
-        if moyenne >= 14:
+        if moyenne >= seuil_bien:
             st.success("**Performance globale excellente** - Les candidats maîtrisent bien les compétences évaluées")
-        elif moyenne >= 12:
+        elif moyenne >= seuil_reussite:
             st.info("**Performance globale satisfaisante** - Niveau acceptable avec quelques points à améliorer")
-        elif moyenne >= 10:
+        elif moyenne >= seuil_reussite - 2:
             st.warning("**Performance globale modérée** - Des efforts supplémentaires sont nécessaires")
         else:
             st.error("**Performance globale faible** - Révision nécessaire du programme de formation")
@@ -923,6 +1992,390 @@ class CorrecteurCompositions:
         else:
             st.warning("⚡ **Forte dispersion** - Grands écarts de niveau entre candidats")
 
+# Percentiles publiés dans les tableaux de distribution
+PERCENTILES = [10, 25, 50, 75, 90]
+
+def percentiles_par_groupe(moyennes, codes, nb_groupes, percentiles=PERCENTILES):
+    """Percentiles (interpolation linéaire, comme np.percentile) de chaque groupe après un seul tri"""
+    ordre = np.lexsort((moyennes, codes))
+    valeurs = moyennes[ordre]
+    effectifs = np.bincount(codes, minlength=nb_groupes)
+    debuts = np.concatenate([[0], np.cumsum(effectifs)[:-1]])
+    
+    q = np.asarray(percentiles, dtype=np.float64) / 100
+    positions = debuts[:, None] + q[None, :] * np.maximum(effectifs - 1, 0)[:, None]
+    bas = np.floor(positions).astype(int)
+    haut = np.ceil(positions).astype(int)
+    vides = effectifs == 0
+    bas[vides] = haut[vides] = 0
+    
+    if len(valeurs) == 0:
+        return np.full((nb_groupes, len(q)), np.nan)
+    resultat = valeurs[bas] + (valeurs[haut] - valeurs[bas]) * (positions - bas)
+    resultat[vides] = np.nan
+    return resultat
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def calculer_distributions(_df_resultats, empreinte):
+    """Histogrammes (classes d'un point de 0 à 20) et percentiles des moyennes, global, par grade et par vicariat"""
+    moyennes_brutes = _df_resultats['moyenne'].to_numpy(dtype=np.float64)
+    valides = ~np.isnan(moyennes_brutes)
+    moyennes = moyennes_brutes[valides]
+    bornes = np.arange(0, 21, dtype=np.float64)
+    libelles = [f"{int(b)}-{int(b) + 1}" for b in bornes[:-1]]
+    
+    distributions = {
+        'bornes': bornes,
+        'histogrammes': {'global': pd.Series(np.histogram(moyennes, bins=bornes)[0], index=libelles)},
+        'percentiles': {'global': pd.Series(
+            np.percentile(moyennes, PERCENTILES) if len(moyennes) else np.full(len(PERCENTILES), np.nan),
+            index=[f"P{p}" for p in PERCENTILES]
+        ).round(2)}
+    }
+    
+    for cle in ['grade', 'vicariat']:
+        codes, modalites = pd.factorize(_df_resultats[cle].fillna("Non spécifié").to_numpy()[valides], sort=True)
+        nb_groupes = len(modalites)
+        
+        # Un seul histogramme 2D : une ligne par groupe, une colonne par classe de note
+        comptes, _, _ = np.histogram2d(codes, moyennes, bins=[np.arange(nb_groupes + 1) - 0.5, bornes])
+        histogrammes = pd.DataFrame(comptes.astype(int), index=modalites, columns=libelles)
+        percentiles = pd.DataFrame(
+            percentiles_par_groupe(moyennes, codes, nb_groupes),
+            index=modalites, columns=[f"P{p}" for p in PERCENTILES]
+        ).round(2)
+        percentiles.insert(0, 'Effectif', np.bincount(codes, minlength=nb_groupes))
+        
+        if cle == 'grade':
+            ordre = [g for g in GRADES_ORDRE if g in modalites] + [g for g in modalites if g not in GRADES_ORDRE]
+            histogrammes = histogrammes.reindex(ordre)
+            percentiles = percentiles.reindex(ordre)
+        histogrammes.index.name = percentiles.index.name = cle.capitalize()
+        distributions['histogrammes'][cle] = histogrammes
+        distributions['percentiles'][cle] = percentiles
+    
+    return distributions
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def calculer_rollups(_df_resultats, _df_candidats, empreinte):
+    """Table de synthèse (vicariat, paroisse, grade) : inscrits, évalués, admis, somme des moyennes"""
+    cles = ['vicariat', 'paroisse', 'grade']
+    candidats = _df_candidats[['matricule'] + cles].drop_duplicates('matricule')
+    candidats = candidats.fillna({cle: "Non spécifié" for cle in cles})
+    
+    inscrits = candidats.groupby(cles).size().rename('inscrits')
+    
+    resultats = _df_resultats[['matricule', 'moyenne', 'decision']].merge(candidats, on='matricule', how='inner')
+    resultats['admis'] = resultats['decision'].isin(DECISIONS_ADMIS)
+    evalues = resultats.groupby(cles).agg(
+        evalues=('moyenne', 'count'),
+        admis=('admis', 'sum'),
+        somme_moyennes=('moyenne', 'sum')
+    )
+    
+    rollups = pd.concat([inscrits, evalues], axis=1).fillna(0).reset_index()
+    rollups[['inscrits', 'evalues', 'admis']] = rollups[['inscrits', 'evalues', 'admis']].astype(int)
+    return rollups
+
+def classer_rollups(rollups, niveau, critere):
+    """Agréger la table de synthèse à un niveau (vicariat ou paroisse) et classer selon un critère"""
+    cles = ['vicariat'] if niveau == 'vicariat' else ['vicariat', 'paroisse']
+    palmares = rollups.groupby(cles, as_index=False)[['inscrits', 'evalues', 'admis', 'somme_moyennes']].sum()
+    
+    with np.errstate(invalid='ignore', divide='ignore'):
+        palmares['Taux de réussite (%)'] = (palmares['admis'] / palmares['evalues'] * 100).round(1)
+        palmares['Moyenne'] = (palmares['somme_moyennes'] / palmares['evalues']).round(2)
+        palmares['Participation (%)'] = (palmares['evalues'] / palmares['inscrits'] * 100).round(1)
+    
+    palmares = palmares.drop(columns='somme_moyennes').rename(columns={
+        'vicariat': 'Vicariat', 'paroisse': 'Paroisse', 'inscrits': 'Inscrits', 'evalues': 'Évalués', 'admis': 'Admis'
+    })
+    palmares = palmares.sort_values([critere, 'Évalués'], ascending=False, kind='mergesort', na_position='last')
+    palmares.insert(0, 'Rang', palmares[critere].rank(method='min', ascending=False).astype('Int64'))
+    return palmares.reset_index(drop=True)
+
+class SimulateurSeuil:
+    """Nombre d'admis pour un seuil quelconque par recherche dichotomique sur des moyennes pré-triées"""
+    
+    # Décalage entre groupes : les moyennes (0-20) de chaque groupe occupent [code*100, code*100+20]
+    DECALAGE = 100.0
+    
+    def __init__(self, df_resultats):
+        grades = df_resultats['grade'].fillna("Non spécifié").to_numpy()
+        vicariats = df_resultats['vicariat'].fillna("Non spécifié").to_numpy()
+        codes, groupes = pd.MultiIndex.from_arrays([grades, vicariats]).factorize(sort=True)
+        self.groupes = pd.MultiIndex.from_tuples(groupes, names=['grade', 'vicariat'])
+        moyennes = df_resultats['moyenne'].to_numpy(dtype=np.float64)
+        valides = ~np.isnan(moyennes)
+        
+        # Un seul tableau trié : groupe puis moyenne
+        self.cles = np.sort(codes[valides] * self.DECALAGE + moyennes[valides])
+        self.bases = np.arange(len(self.groupes)) * self.DECALAGE
+        self.debuts = np.searchsorted(self.cles, self.bases, side='left')
+        self.fins = np.searchsorted(self.cles, self.bases + self.DECALAGE / 2, side='left')
+    
+    def compter_admis(self, seuil):
+        """Effectif et admis par (grade, vicariat) pour le seuil donné"""
+        positions = np.searchsorted(self.cles, self.bases + seuil, side='left')
+        return pd.DataFrame({
+            'Effectif': self.fins - self.debuts,
+            'Admis': self.fins - positions
+        }, index=self.groupes)
+    
+    def admis_par_grade(self, seuil):
+        """Effectif, admis et taux de réussite par grade pour le seuil donné"""
+        par_grade = self.compter_admis(seuil).groupby(level='grade').sum()
+        par_grade = par_grade.reindex([g for g in GRADES_ORDRE if g in par_grade.index])
+        par_grade['Taux (%)'] = (par_grade['Admis'] / par_grade['Effectif'] * 100).round(1)
+        return par_grade
+
+class AnalyseCompositions:
+    """Statistiques par composition calculées en une passe NumPy sur la matrice COMPO1..COMPO5"""
+    
+    def __init__(self, df):
+        self.colonnes = [col for col in COLONNES_COMPOS if col in df.columns]
+        self.matrice = df[self.colonnes].to_numpy(dtype=np.float32)
+        self.presentes = ~np.isnan(self.matrice)
+        self.valeurs = np.where(self.presentes, self.matrice, 0).astype(np.float64)
+        self.groupes = {
+            cle: df[cle].fillna("Non spécifié").to_numpy()
+            for cle in ['grade', 'vicariat'] if cle in df.columns
+        }
+    
+    def statistiques(self):
+        """Effectif, moyenne, écart-type, extrêmes et difficulté de chaque composition"""
+        effectifs = self.presentes.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            moyennes = self.valeurs.sum(axis=0) / effectifs
+            variances = (self.valeurs ** 2).sum(axis=0) / effectifs - moyennes ** 2
+            ecarts_types = np.sqrt(np.clip(variances * effectifs / np.maximum(effectifs - 1, 1), 0, None))
+            reussites = ((self.matrice >= 10) & self.presentes).sum(axis=0) / effectifs * 100
+        
+        return pd.DataFrame({
+            'Effectif': effectifs,
+            'Moyenne': moyennes,
+            'Ecart-type': ecarts_types,
+            'Minimum': np.where(effectifs > 0, np.where(self.presentes, self.valeurs, np.inf).min(axis=0), np.nan),
+            'Maximum': np.where(effectifs > 0, np.where(self.presentes, self.valeurs, -np.inf).max(axis=0), np.nan),
+            '% ≥ 10': reussites,
+            # Indice de difficulté : 0 = composition facile, 1 = composition très difficile
+            'Difficulté': 1 - moyennes / 20
+        }, index=self.colonnes).round(2)
+    
+    def correlations(self):
+        """Corrélations de Pearson entre compositions (paires de notes présentes)"""
+        presentes = self.presentes.astype(np.float64)
+        effectifs = presentes.T @ presentes
+        sommes = self.valeurs.T @ presentes           # somme de x_i sur les lignes où x_j est présent
+        sommes_carres = (self.valeurs ** 2).T @ presentes
+        produits = self.valeurs.T @ self.valeurs
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            moyennes = sommes / effectifs
+            covariances = produits / effectifs - moyennes * moyennes.T
+            variances = sommes_carres / effectifs - moyennes ** 2
+            correlations = covariances / np.sqrt(variances * variances.T)
+        
+        return pd.DataFrame(correlations, index=self.colonnes, columns=self.colonnes).round(2)
+    
+    def moyennes_par_groupe(self, cle):
+        """Moyenne de chaque composition par grade ou par vicariat"""
+        if cle not in self.groupes:
+            return pd.DataFrame()
+        codes, modalites = pd.factorize(self.groupes[cle], sort=True)
+        sommes = np.zeros((len(modalites), len(self.colonnes)))
+        effectifs = np.zeros((len(modalites), len(self.colonnes)))
+        np.add.at(sommes, codes, self.valeurs)
+        np.add.at(effectifs, codes, self.presentes)
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            moyennes = pd.DataFrame(sommes / effectifs, index=modalites, columns=self.colonnes).round(2)
+        moyennes.index.name = cle.capitalize()
+        if cle == 'grade':
+            moyennes = moyennes.reindex([g for g in GRADES_ORDRE if g in moyennes.index])
+        return moyennes
+    
+    def afficher(self):
+        """Afficher l'analyse par composition"""
+        st.subheader("🧩 Analyse par Composition")
+        
+        st.write("**Statistiques par composition:**")
+        stats = self.statistiques()
+        st.dataframe(stats, use_container_width=True)
+        
+        plus_difficile = stats['Difficulté'].idxmax()
+        plus_facile = stats['Difficulté'].idxmin()
+        st.info(f"📉 Composition la plus difficile : **{plus_difficile}** — 📈 la plus réussie : **{plus_facile}**")
+        
+        st.write("**Corrélations entre compositions:**")
+        st.dataframe(self.correlations(), use_container_width=True)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.write("**Moyennes par grade:**")
+            st.dataframe(self.moyennes_par_groupe('grade'), use_container_width=True)
+        with col2:
+            st.write("**Moyennes par vicariat:**")
+            st.dataframe(self.moyennes_par_groupe('vicariat'), use_container_width=True)
+
+class ClassementIncremental:
+    """Classement d'un grade tenu dans une liste triée : repositionner un candidat ne demande que des recherches dichotomiques"""
+    
+    def __init__(self, mode_classement='ex aequo'):
+        self.mode_classement = mode_classement
+        self.cles = []  # Clés croissantes = notes décroissantes
+        self.cle_par_matricule = {}
+        self.moyennes = []  # Moyennes distinctes (rang dense), même convention
+        self.effectifs = {}
+    
+    def cle(self, moyenne, compos):
+        """Clé de tri : moyenne puis, en mode départage, COMPO1..COMPO5 (absentes après toutes les notes)"""
+        valeurs = [moyenne] + (list(compos) if self.mode_classement == 'départage' else [])
+        return tuple(-float(v) if v == v else 1.0 for v in valeurs)
+    
+    def construire(self, matricules, moyennes, compos):
+        """Remplir le classement en une fois (un seul tri)"""
+        for matricule, moyenne, ligne in zip(matricules, moyennes, compos):
+            if moyenne == moyenne:
+                self.cle_par_matricule[matricule] = self.cle(moyenne, ligne)
+                self.effectifs[-float(moyenne)] = self.effectifs.get(-float(moyenne), 0) + 1
+        self.cles = sorted(self.cle_par_matricule.values())
+        self.moyennes = sorted(self.effectifs)
+    
+    def retirer(self, matricule):
+        """Sortir un candidat du classement (notes effacées)"""
+        cle = self.cle_par_matricule.pop(matricule, None)
+        if cle is None:
+            return
+        del self.cles[bisect_left(self.cles, cle)]
+        self.effectifs[cle[0]] -= 1
+        if not self.effectifs[cle[0]]:
+            del self.effectifs[cle[0]]
+            del self.moyennes[bisect_left(self.moyennes, cle[0])]
+    
+    def placer(self, matricule, moyenne, compos):
+        """Insérer ou repositionner un candidat après modification de ses notes"""
+        self.retirer(matricule)
+        if moyenne != moyenne:
+            return
+        cle = self.cle(moyenne, compos)
+        self.cle_par_matricule[matricule] = cle
+        insort(self.cles, cle)
+        if cle[0] not in self.effectifs:
+            insort(self.moyennes, cle[0])
+        self.effectifs[cle[0]] = self.effectifs.get(cle[0], 0) + 1
+    
+    def rang(self, matricule):
+        """Rang du candidat (None s'il n'est pas classé) : nombre de candidats strictement devant, plus un"""
+        cle = self.cle_par_matricule.get(matricule)
+        if cle is None:
+            return None
+        if self.mode_classement == 'dense':
+            return bisect_left(self.moyennes, cle[0]) + 1
+        return bisect_left(self.cles, cle) + 1
+
+class GrilleNotation:
+    """Saisie et correction des notes dans l'application : seul le candidat modifié est recalculé et reclassé"""
+    
+    COLONNES = ['matricule', 'nom', 'prenom', 'grade', 'vicariat'] + COLONNES_COMPOS + ['moyenne', 'mention', 'decision']
+    COLONNES_RESULTATS = ['matricule', 'nom', 'prenom', 'grade', 'vicariat'] + COLONNES_COMPOS + ['moyenne', 'rang', 'mention', 'decision']
+    
+    def __init__(self, df_resultats, df_candidats, correcteur, notes_en_attente=None):
+        self.bareme = correcteur.bareme
+        roster = df_candidats[['matricule', 'nom', 'prenom', 'grade', 'vicariat']].drop_duplicates('matricule')
+        roster = roster[roster['grade'].isin(GRADES_ORDRE)]
+        notes = df_resultats.reindex(columns=['matricule'] + COLONNES_COMPOS + ['moyenne', 'mention', 'decision'])
+        table = roster.merge(notes, on='matricule', how='left').sort_values('matricule').set_index('matricule')
+        table[['mention', 'decision']] = table[['mention', 'decision']].astype(object)
+        
+        # Candidats en attente d'arbitrage : notes concordantes reprises, compositions disputées à saisir
+        self.en_attente = {}
+        if notes_en_attente is not None and not notes_en_attente.empty:
+            attente = notes_en_attente.drop_duplicates('matricule').set_index('matricule')
+            attente = attente[attente.index.isin(table.index)]
+            table.loc[attente.index, COLONNES_COMPOS] = attente[COLONNES_COMPOS]
+            table.loc[attente.index, 'decision'] = DECISION_ARBITRAGE
+            self.en_attente = {matricule: set(compos.split(', ')) for matricule, compos in attente['arbitrage'].items()}
+        table[COLONNES_COMPOS] = table[COLONNES_COMPOS].astype(np.float32)
+        table['moyenne'] = table['moyenne'].astype(np.float64)
+        self.table = table
+        self.origine = table[COLONNES_COMPOS].copy()  # Notes du fichier, rétablies quand une saisie est effacée
+        self.saisies = set()  # Cellules (matricule, COMPOn) dont la note saisie remplace celle du fichier
+        
+        self.classements = {}
+        for grade, groupe in table.groupby('grade'):
+            classement = ClassementIncremental(correcteur.mode_classement)
+            classement.construire(groupe.index, groupe['moyenne'].to_numpy(), groupe[COLONNES_COMPOS].to_numpy())
+            self.classements[grade] = classement
+        
+        # Résultats tenus par grade : seuls les grades modifiés depuis le dernier appel à resultats() sont reclassés
+        self.blocs = {}
+        self.grades_modifies = set(self.classements)
+        self.df_resultats = pd.DataFrame()
+        self.empreinte = None
+    
+    def modifier(self, matricule, notes):
+        """Appliquer des notes {COMPOn: valeur ou None} à un candidat : moyenne, mention, décision et rang"""
+        for col, valeur in notes.items():
+            self.table.at[matricule, col] = self.origine.at[matricule, col] if valeur is None else valeur
+            if valeur is None:
+                self.saisies.discard((matricule, col))
+            else:
+                self.saisies.add((matricule, col))
+        
+        compos = self.table.loc[matricule, COLONNES_COMPOS].to_numpy(dtype=np.float32)
+        moyenne = self.bareme.calculer_moyennes(compos[np.newaxis, :])[0]
+        a_arbitrer = any((matricule, col) not in self.saisies for col in self.en_attente.get(matricule, ()))
+        if a_arbitrer:
+            moyenne = np.nan  # Pas de moyenne partielle tant qu'une composition disputée n'est pas saisie
+        grade = self.table.at[matricule, 'grade']
+        self.table.at[matricule, 'moyenne'] = moyenne
+        if moyenne == moyenne:
+            self.table.at[matricule, 'mention'] = self.bareme.mentions(np.array([moyenne]))[0]
+            self.table.at[matricule, 'decision'] = self.bareme.decisions(np.array([moyenne]), np.array([grade]))[0]
+        else:
+            self.table.at[matricule, 'mention'] = None
+            self.table.at[matricule, 'decision'] = DECISION_ARBITRAGE if a_arbitrer else None
+        self.classements[grade].placer(matricule, moyenne, compos)
+        self.grades_modifies.add(grade)
+    
+    def appliquer_saisies(self, saisies):
+        """Rejouer les notes saisies enregistrées (matricule, code COMPn, note) sur les notes du fichier"""
+        saisies = saisies[saisies['matricule'].isin(self.table.index)]
+        for matricule, groupe in saisies.groupby('matricule'):
+            self.modifier(matricule, dict(zip(groupe['code_matiere'].str.replace('COMP', 'COMPO'), groupe['note'])))
+    
+    def grade(self, grade):
+        """Candidats d'un grade avec leur rang courant (ordre des matricules, stable d'une saisie à l'autre)"""
+        df = self.table[self.table['grade'] == grade].reset_index()[self.COLONNES]
+        classement = self.classements.get(grade)
+        df.insert(len(df.columns) - 2, 'rang', [classement.rang(m) if classement else None for m in df['matricule']])
+        df['rang'] = df['rang'].astype('Int64')
+        saisies = {}
+        for matricule, col in sorted(self.saisies):
+            saisies[matricule] = f"{saisies[matricule]}, {col}" if matricule in saisies else col
+        df['saisies'] = df['matricule'].map(saisies).fillna('')
+        return df
+    
+    def bloc(self, grade):
+        """Résultats d'un grade (candidats ayant au moins une note) triés par rang"""
+        notes = self.table[(self.table['grade'] == grade) & self.table['moyenne'].notna()]
+        df = notes.reset_index()
+        classement = self.classements[grade]
+        df['rang'] = np.array([classement.rang(m) for m in df['matricule']], dtype=np.int64)
+        return df.sort_values(['rang', 'matricule'], kind='mergesort')[self.COLONNES_RESULTATS]
+    
+    def resultats(self):
+        """Résultats courants au format de proclamer_resultats, repris tels quels tant qu'aucune note n'a changé"""
+        if self.grades_modifies:
+            for grade in self.grades_modifies:
+                self.blocs[grade] = self.bloc(grade)
+            self.grades_modifies.clear()
+            blocs = [self.blocs[g] for g in GRADES_ORDRE if g in self.blocs and not self.blocs[g].empty]
+            self.df_resultats = pd.concat(blocs, ignore_index=True) if blocs else pd.DataFrame()
+            self.empreinte = empreinte_resultats(self.df_resultats) if blocs else None
+        return self.df_resultats
+
 def generer_matricule(nom, grade, ordre, annee_courante=None):
     if annee_courante is None:
         annee_courante = datetime.now().year
@@ -938,30 +2391,222 @@ def generer_matricule(nom, grade, ordre, annee_courante=None):
     
     return f"{ordre:03d}-{init_grade}-{annee}"
 
-def assigner_matricules(df):
-    """Assigner les matricules en évitant les doublons"""
-    df_unique = df.drop_duplicates(subset=['nom', 'prenom', 'grade'])
-    df_sorted = df_unique.sort_values(['nom', 'prenom'])
-    annee_courante = datetime.now().year
-    
-    matricules = []
-    for grade in GRADES_ORDRE:
-        if grade in df_sorted['grade'].unique():
-            df_grade = df_sorted[df_sorted['grade'] == grade].copy()
-            df_grade = df_grade.reset_index(drop=True)
-            
-            for idx, row in df_grade.iterrows():
-                matricule = generer_matricule(row['nom'], row['grade'], idx + 1, annee_courante)
-                matricules.append({
-                    'nom': row['nom'], 
-                    'prenom': row['prenom'], 
-                    'matricule': matricule, 
-                    'grade': row['grade']
-                })
+@st.cache_resource(show_spinner=False)
+def initialiser_tables_matricules(chemin_base=CHEMIN_BASE):
+    """Créer une seule fois par processus les tables d'attribution des matricules"""
+    with connexion_base(chemin_base) as conn, conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS matricules_attribues (
+                activite TEXT NOT NULL,
+                annee INTEGER NOT NULL,
+                grade TEXT NOT NULL,
+                ordre INTEGER NOT NULL,
+                cle_candidat TEXT NOT NULL,
+                matricule TEXT NOT NULL,
+                created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (activite, annee, grade, ordre),
+                UNIQUE (activite, annee, grade, cle_candidat)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS candidats_tardifs (
+                activite TEXT NOT NULL,
+                annee INTEGER NOT NULL,
+                matricule TEXT NOT NULL,
+                nom TEXT NOT NULL,
+                prenom TEXT NOT NULL,
+                grade TEXT NOT NULL,
+                genre TEXT,
+                date_naissance TEXT,
+                paroisse TEXT,
+                vicariat TEXT,
+                created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (activite, annee, matricule)
+            )
+        """)
+    return True
+
+class AllocateurMatricules:
+    """Séquences de matricules par (activité, grade, année), persistées dans la base SQLite"""
+    
+    COLONNES_TARDIFS = ['nom', 'prenom', 'grade', 'genre', 'date_naissance', 'paroisse', 'vicariat', 'matricule']
+    
+    def __init__(self, activite, annee_courante=None, chemin_base=CHEMIN_BASE):
+        self.activite = activite
+        self.annee = annee_courante or datetime.now().year
+        self.chemin_base = chemin_base
+        initialiser_tables_matricules(chemin_base)
+    
+    def attribuer(self, df):
+        """Attribuer les matricules : les candidats connus gardent le leur, les nouveaux prennent la suite de la séquence"""
+        df_unique = df.drop_duplicates(subset=['nom', 'prenom', 'grade'])[['nom', 'prenom', 'grade']].copy()
+        # Clé normalisée (accents, casse, espaces) : deux graphies d'une même personne partagent un matricule
+        df_unique['cle_candidat'] = cles_candidats(df_unique['nom'], df_unique['prenom'])
+        personnes = df_unique.sort_values(['nom', 'prenom']).drop_duplicates(subset=['grade', 'cle_candidat'])
+        
+        with connexion_base(self.chemin_base) as conn:
+            # Verrou d'écriture : lecture des séquences et insertion atomiques entre sessions
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                existants = pd.read_sql_query(
+                    "SELECT grade, ordre, cle_candidat, matricule FROM matricules_attribues WHERE activite = ? AND annee = ?",
+                    conn, params=(self.activite, self.annee)
+                )
+                personnes = personnes.merge(existants[['grade', 'cle_candidat', 'matricule']], on=['grade', 'cle_candidat'], how='left')
+                
+                nouveaux = personnes[personnes['matricule'].isna()].copy()
+                if not nouveaux.empty:
+                    derniers_ordres = existants.groupby('grade')['ordre'].max()
+                    nouveaux['ordre'] = (
+                        nouveaux['grade'].map(derniers_ordres).fillna(0).astype(int)
+                        + nouveaux.groupby('grade').cumcount() + 1
+                    )
+                    nouveaux['matricule'] = [
+                        generer_matricule(n, g, o, self.annee)
+                        for n, g, o in zip(nouveaux['nom'], nouveaux['grade'], nouveaux['ordre'])
+                    ]
+                    conn.executemany(
+                        "INSERT INTO matricules_attribues (activite, annee, grade, ordre, cle_candidat, matricule) VALUES (?, ?, ?, ?, ?, ?)",
+                        [(self.activite, self.annee, g, int(o), c, m) for g, o, c, m in
+                         zip(nouveaux['grade'], nouveaux['ordre'], nouveaux['cle_candidat'], nouveaux['matricule'])]
+                    )
+                    personnes.loc[nouveaux.index, 'matricule'] = nouveaux['matricule']
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        
+        df_unique = df_unique.merge(personnes[['grade', 'cle_candidat', 'matricule']], on=['grade', 'cle_candidat'], how='left')
+        return df_unique[['nom', 'prenom', 'matricule', 'grade']]
+    
+    def enregistrer_tardifs(self, df_tardifs):
+        """Enregistrer des candidats ajoutés en retard pour qu'ils survivent aux rechargements"""
+        lignes = df_tardifs.reindex(columns=self.COLONNES_TARDIFS)
+        lignes = lignes.astype(object).where(lignes.notna(), None)
+        with connexion_base(self.chemin_base) as conn, conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO candidats_tardifs (activite, annee, {', '.join(self.COLONNES_TARDIFS)}) "
+                f"VALUES (?, ?, {', '.join('?' * len(self.COLONNES_TARDIFS))})",
+                [(self.activite, self.annee, *ligne) for ligne in lignes.itertuples(index=False, name=None)]
+            )
     
-    return pd.DataFrame(matricules)
+    def charger_tardifs(self):
+        """Charger les candidats ajoutés en retard pour l'activité et l'année"""
+        with connexion_base(self.chemin_base) as conn:
+            return pd.read_sql_query(
+                f"SELECT {', '.join(self.COLONNES_TARDIFS)} FROM candidats_tardifs WHERE activite = ? AND annee = ? ORDER BY created_date",
+                conn, params=(self.activite, self.annee)
+            )
+
+def assigner_matricules(df, allocateur):
+    """Assigner les matricules en évitant les doublons (numérotation stable d'un import à l'autre)"""
+    return allocateur.attribuer(df)
+
+def integrer_candidats_tardifs(df_complet, allocateur, index_candidats=None):
+    """Ajouter au roster les candidats tardifs enregistrés qui n'y figurent pas encore"""
+    df_tardifs = allocateur.charger_tardifs()
+    df_tardifs = df_tardifs[~df_tardifs['matricule'].isin(df_complet['matricule'])]
+    if df_tardifs.empty:
+        return df_complet
+    if index_candidats is not None:
+        index_candidats.update(zip(cles_candidats(df_tardifs['nom'], df_tardifs['prenom']), df_tardifs['grade']))
+    return pd.concat([df_complet, df_tardifs], ignore_index=True)
 
-def ajouter_candidat_manuel(df_existant):
+def lire_fichier_tardifs(fichier):
+    """Lire un petit fichier de candidats tardifs (xlsx ou CSV)"""
+    df, _ = lire_tableau(fichier, SCHEMA_CANDIDATS, dtypes={**TYPES_CANDIDATS, 'date_naissance': str})
+    return df
+
+def dates_naissance(serie):
+    """Dates de naissance lues en cellules Excel (AAAA-MM-JJ) ou saisies en texte (JJ/MM/AAAA), NaT si invalides"""
+    textes = serie.astype('string').str.strip()
+    return pd.to_datetime(textes, format='ISO8601', errors='coerce').fillna(
+        pd.to_datetime(textes, dayfirst=True, errors='coerce', format='mixed')
+    )
+
+def valider_candidats_tardifs(df_lot, index_candidats):
+    """Valider un lot de candidats tardifs contre l'index du roster (une passe vectorisée)"""
+    df_lot = df_lot.copy()
+    for col in ['nom', 'prenom', 'grade', 'genre', 'paroisse']:
+        df_lot[col] = df_lot[col].astype('string').str.strip()
+    df_lot['genre'] = df_lot['genre'].str.upper()
+    dates = dates_naissance(df_lot['date_naissance'])
+    
+    cles = cles_candidats(df_lot['nom'], df_lot['prenom'])
+    deja_inscrit = pd.Series([(c, g) in index_candidats for c, g in zip(cles, df_lot['grade'])], index=df_lot.index)
+    
+    motifs = pd.Series('', index=df_lot.index)
+    motifs[df_lot[['nom', 'prenom', 'grade', 'genre', 'paroisse']].isna().any(axis=1)] += 'Champ obligatoire manquant; '
+    motifs[~df_lot['grade'].isin(GRADES_ORDRE)] += 'Grade inconnu; '
+    motifs[~df_lot['genre'].isin(['M', 'F'])] += 'Genre invalide; '
+    motifs[dates.isna()] += 'Date de naissance invalide; '
+    motifs[deja_inscrit] += 'Déjà inscrit; '
+    motifs[pd.Series(list(zip(cles, df_lot['grade'])), index=df_lot.index).duplicated()] += 'Doublon dans le fichier; '
+    
+    valides = df_lot[motifs == ''].copy()
+    valides['date_naissance'] = dates[motifs == ''].dt.strftime('%d/%m/%Y')
+    rejetes = df_lot[motifs != ''].copy()
+    rejetes.insert(0, 'motif', motifs[motifs != ''].str.rstrip('; '))
+    return valides, rejetes
+
+def importer_candidats_tardifs_en_lot(df_existant, allocateur, index_candidats=None):
+    """Interface d'import groupé de candidats tardifs (xlsx/CSV)"""
+    st.subheader("📥 Importer une liste de candidats en retard")
+    
+    fichier = st.file_uploader(
+        "Fichier des candidats en retard",
+        type=['xlsx', 'csv'],
+        key=f"tardifs_{allocateur.activite}",
+        help="Colonnes requises: nom, prenom, grade, genre, date_naissance, paroisse"
+    )
+    if fichier is None:
+        return df_existant
+    
+    try:
+        df_lot = lire_fichier_tardifs(fichier)
+    except Exception as e:
+        st.error(f"Erreur lors de la lecture du fichier: {e}")
+        return df_existant
+    
+    colonnes_requises = ['nom', 'prenom', 'grade', 'genre', 'date_naissance', 'paroisse']
+    colonnes_manquantes = [col for col in colonnes_requises if col not in df_lot.columns]
+    if colonnes_manquantes:
+        st.error(f"Colonnes manquantes: {', '.join(colonnes_manquantes)}")
+        return df_existant
+    
+    if index_candidats is None:
+        index_candidats = set(zip(cles_candidats(df_existant['nom'], df_existant['prenom']), df_existant['grade']))
+    
+    valides, rejetes = valider_candidats_tardifs(df_lot, index_candidats)
+    
+    if not rejetes.empty:
+        st.warning(f"⚠️ {len(rejetes)} ligne(s) rejetée(s)")
+        st.dataframe(rejetes, use_container_width=True)
+    
+    if valides.empty:
+        st.info("Aucun nouveau candidat à ajouter")
+        return df_existant
+    
+    st.write(f"**{len(valides)} candidat(s) prêt(s) à être ajouté(s)**")
+    if not st.button("Ajouter ces candidats", key=f"ajout_lot_{allocateur.activite}"):
+        return df_existant
+    
+    # Attribution des matricules en un seul lot
+    df_matricules = allocateur.attribuer(valides)
+    valides = valides.merge(df_matricules, on=['nom', 'prenom', 'grade'], how='left')
+    if 'vicariat' not in valides.columns or valides['vicariat'].isna().all():
+        registre = charger_registre_organisation()
+        valides['paroisse'] = registre.normaliser_paroisses(valides['paroisse'])
+        valides['vicariat'] = registre.vicariats_des_paroisses(valides['paroisse'])
+    valides = valides.reindex(columns=df_existant.columns.union(AllocateurMatricules.COLONNES_TARDIFS, sort=False))
+    
+    allocateur.enregistrer_tardifs(valides)
+    index_candidats.update(zip(cles_candidats(valides['nom'], valides['prenom']), valides['grade']))
+    
+    st.success(f"✅ {len(valides)} candidat(s) ajouté(s)")
+    return pd.concat([df_existant, valides], ignore_index=True)
+
+def ajouter_candidat_manuel(df_existant, allocateur, index_candidats=None):
     """Interface pour ajouter manuellement un candidat en retard"""
     st.subheader("➕ Ajouter un candidat en retard")
     
@@ -976,7 +2621,7 @@ def ajouter_candidat_manuel(df_existant):
         with col2:
             genre = st.selectbox("Genre *", ["M", "F"])
             date_naissance = st.date_input("Date de naissance *")
-            paroisse = st.selectbox("Paroisse *", list(set([p for paroisses in VICARIATS.values() for p in paroisses])))
+            paroisse = st.selectbox("Paroisse *", charger_registre_organisation().paroisses)
         
         submitted = st.form_submit_button("Ajouter le candidat")
         
@@ -985,16 +2630,16 @@ def ajouter_candidat_manuel(df_existant):
                 st.error("Veuillez remplir tous les champs obligatoires (*)")
                 return df_existant
             
-            # Vérifier si le candidat existe déjà
-            existe = ((df_existant['nom'] == nom) & (df_existant['prenom'] == prenom) & (df_existant['grade'] == grade)).any()
-            if existe:
+            # Vérifier si le candidat existe déjà (index des clés normalisées)
+            if index_candidats is None:
+                index_candidats = set(zip(cles_candidats(df_existant['nom'], df_existant['prenom']), df_existant['grade']))
+            cle = cle_candidat(nom, prenom)
+            if (cle, grade) in index_candidats:
                 st.error("Ce candidat existe déjà dans la base de données")
                 return df_existant
             
-            # Générer le matricule
-            df_grade = df_existant[df_existant['grade'] == grade]
-            nouvel_ordre = len(df_grade) + 1
-            matricule = generer_matricule(nom, grade, nouvel_ordre)
+            # Générer le matricule (suite de la séquence persistée du grade)
+            matricule = allocateur.attribuer(pd.DataFrame([{'nom': nom, 'prenom': prenom, 'grade': grade}]))['matricule'].iloc[0]
             
             # Ajouter le nouveau candidat
             nouveau_candidat = {
@@ -1008,7 +2653,9 @@ def ajouter_candidat_manuel(df_existant):
                 'vicariat': determiner_vicariat(paroisse)
             }
             
+            allocateur.enregistrer_tardifs(pd.DataFrame([nouveau_candidat]))
             df_existant = pd.concat([df_existant, pd.DataFrame([nouveau_candidat])], ignore_index=True)
+            index_candidats.add((cle, grade))
             st.success(f"✅ Candidat ajouté avec succès ! Matricule : {matricule}")
             
             return df_existant
@@ -1118,6 +2765,338 @@ def generer_fichier_notes_excel(df_candidats):
     buffer.seek(0)
     return buffer
 
+def nom_fichier_sur(nom):
+    """Nom utilisable comme fichier (accents et caractères spéciaux retirés)"""
+    return re.sub(r'[^A-Za-z0-9]+', '_', normaliser_texte(nom)).strip('_') or 'non_specifie'
+
+@st.cache_resource(show_spinner=False)
+def pool_rendu():
+    """Pool de processus de rendu (PDF, Excel), démarré une seule fois et partagé par toutes les sessions"""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    # spawn : pas de fork d'un serveur multi-thread
+    return ProcessPoolExecutor(max_workers=os.cpu_count() or 1, mp_context=multiprocessing.get_context('spawn'))
+
+def executer_rendus(fonction, taches):
+    """Exécuter des tâches de rendu sur le pool de processus ; résultats restitués au fil de leur achèvement"""
+    from concurrent.futures import as_completed
+    from concurrent.futures.process import BrokenProcessPool
+    
+    restantes = dict(enumerate(taches))
+    if len(restantes) > 1 and (os.cpu_count() or 1) > 1:
+        try:
+            futurs = {pool_rendu().submit(fonction, tache): i for i, tache in restantes.items()}
+            for futur in as_completed(futurs):
+                resultat = futur.result()
+                del restantes[futurs.pop(futur)]
+                yield resultat
+        except BrokenProcessPool:
+            pool_rendu.clear()
+    
+    # Une seule tâche, un seul cœur ou pool hors service : rendu direct
+    for tache in restantes.values():
+        yield fonction(tache)
+
+def rendre_lots_pdf(lots, activite):
+    """Rendre des lots de bulletins (nom, candidats) en PDF ; renvoie [(nom, octets)] dans l'ordre des lots"""
+    import rendu_bulletins
+    
+    titre = "Week-end de Formation des Animateurs" if activite == "weekend" else "Session Diocésaine"
+    taches = [(nom, candidats, titre, datetime.now().year) for nom, candidats in lots]
+    rendus = dict(executer_rendus(rendu_bulletins.rendre_lot, taches))
+    return [(nom, rendus[nom]) for nom, _ in lots]
+
+def generer_bulletins(df_resultats, df_candidats, activite, par_paroisse=False, taille_lot=300):
+    """Générer les bulletins individuels : un PDF fusionné, ou une archive ZIP d'un PDF par paroisse"""
+    import zipfile
+    try:
+        from pypdf import PdfWriter
+    except ImportError:
+        PdfWriter = None
+    
+    df = df_resultats.drop(columns=['paroisse'], errors='ignore').merge(
+        df_candidats[['matricule', 'paroisse']].drop_duplicates('matricule'), on='matricule', how='left'
+    )
+    df['paroisse'] = df['paroisse'].fillna(RegistreOrganisation.NON_SPECIFIE)
+    df['grade'] = pd.Categorical(df['grade'], categories=GRADES_ORDRE, ordered=True)
+    df = df.sort_values(['paroisse', 'grade', 'nom', 'prenom'] if par_paroisse else ['grade', 'rang', 'nom'])
+    df['grade'] = df['grade'].astype(str)
+    colonnes = ['matricule', 'nom', 'prenom', 'grade', 'paroisse', 'vicariat'] + COLONNES_COMPOS + ['moyenne', 'rang', 'mention', 'decision']
+    df = df.reindex(columns=colonnes)
+    
+    if par_paroisse:
+        lots = [(paroisse, groupe.to_dict('records')) for paroisse, groupe in df.groupby('paroisse', sort=True)]
+    else:
+        candidats = df.to_dict('records')
+        # Sans pypdf pour fusionner les morceaux, le PDF unique est rendu d'un seul tenant
+        taille = taille_lot if PdfWriter is not None else max(len(candidats), 1)
+        lots = [(f"lot_{i // taille + 1}", candidats[i:i + taille]) for i in range(0, len(candidats), taille)]
+    if not lots:
+        return None
+    
+    rendus = rendre_lots_pdf(lots, activite)
+    buffer = BytesIO()
+    if par_paroisse:
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for paroisse, pdf in rendus:
+                archive.writestr(f"bulletins_{nom_fichier_sur(paroisse)}.pdf", pdf)
+    elif len(rendus) == 1:
+        buffer.write(rendus[0][1])
+    else:
+        fusion = PdfWriter()
+        for _, pdf in rendus:
+            fusion.append(BytesIO(pdf))
+        fusion.write(buffer)
+    buffer.seek(0)
+    return buffer
+
+def preparer_consultation(df_resultats, df_candidats, sel):
+    """Résultats consultables indexés par clé dérivée (matricule, date de naissance), et nombre de candidats sans date valide"""
+    from concurrent.futures import ThreadPoolExecutor
+    from service_resultats import cle_consultation
+    
+    naissances = df_candidats.reindex(columns=['matricule', 'date_naissance']).drop_duplicates('matricule').set_index('matricule')['date_naissance']
+    dates = dates_naissance(df_resultats['matricule'].map(naissances))
+    publiables = dates.notna().to_numpy()
+    consultation = df_resultats.loc[publiables, COLONNES_CONSULTATION].copy()
+    consultation['moyenne'] = consultation['moyenne'].astype(np.float64).round(2)
+    # Dérivation PBKDF2 volontairement lente : répartie sur les cœurs (hashlib relâche le GIL pendant le calcul)
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executeur:
+        consultation.index = list(executeur.map(
+            lambda matricule, date: cle_consultation(sel, str(matricule), date),
+            df_resultats['matricule'][publiables], dates[publiables].dt.strftime('%Y-%m-%d')
+        ))
+    return consultation[~consultation.index.duplicated()], int((~publiables).sum())
+
+def publier_resultats(df_resultats, df_candidats, activite, chemin=None):
+    """Écrire l'instantané lu par le service de consultation (remplacement atomique du fichier)"""
+    from service_resultats import lire_sel
+    
+    chemin = chemin or CHEMIN_PUBLICATION.format(activite=activite)
+    # Sel secret partagé avec le service, jamais écrit dans l'instantané
+    consultation, sans_date = preparer_consultation(df_resultats, df_candidats, lire_sel(creer=True))
+    instantane = {
+        'activite': activite,
+        'annee': datetime.now().year,
+        'publie_le': datetime.now().isoformat(timespec='seconds'),
+        'resultats': json.loads(consultation.to_json(orient='index', force_ascii=False))
+    }
+    temporaire = f"{chemin}.tmp"
+    with open(temporaire, 'w', encoding='utf-8') as fichier:
+        json.dump(instantane, fichier, ensure_ascii=False)
+    os.replace(temporaire, chemin)
+    return chemin, len(consultation), sans_date
+
+def generer_publication_statique(df_resultats, df_candidats, activite):
+    """Archive ZIP à déposer sur un hébergement statique (page de recherche, manifeste, lots par début de clé) et nombre de candidats sans date valide"""
+    import zipfile
+    from service_resultats import ITERATIONS_CONSULTATION
+    
+    # Le navigateur doit dériver la clé : ce sel est public, seule la lenteur de PBKDF2 freine l'énumération
+    sel = secrets.token_hex(16)
+    consultation, sans_date = preparer_consultation(df_resultats, df_candidats, sel)
+    # Une passe : lot tiré de la clé, puis un tri et un découpage par lot
+    consultation = consultation.sort_index()
+    lots = consultation.index.str[:LONGUEUR_PREFIXE_PUBLICATION]
+    
+    manifeste = {
+        'activite': activite,
+        'titre': "Week-end de Formation des Animateurs" if activite == "weekend" else "Session Diocésaine",
+        'annee': datetime.now().year,
+        'publie_le': datetime.now().isoformat(timespec='seconds'),
+        'sel': sel,
+        'iterations': ITERATIONS_CONSULTATION,
+        'longueur_prefixe': LONGUEUR_PREFIXE_PUBLICATION,
+        'candidats': len(consultation)
+    }
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.write(CHEMIN_PAGE_PUBLICATION, "index.html")
+        archive.writestr("manifeste.json", json.dumps(manifeste, ensure_ascii=False))
+        for lot, groupe in consultation.groupby(lots, sort=False):
+            archive.writestr(f"resultats/{lot}.json", groupe.to_json(orient='index', force_ascii=False))
+    buffer.seek(0)
+    return buffer, sans_date
+
+def afficher_export_bulletins(df_resultats, df_candidats, activite):
+    """Section d'export des bulletins individuels de résultats"""
+    st.subheader("🧾 Bulletins Individuels")
+    format_bulletins = st.radio(
+        "Format des bulletins:",
+        ["fusion", "paroisses"],
+        format_func=lambda x: "📄 Un seul PDF" if x == "fusion" else "🗂️ Un PDF par paroisse (ZIP)",
+        horizontal=True,
+        key=f"format_bulletins_{activite}"
+    )
+    
+    if st.button("🧾 Générer les bulletins", key=f"bulletins_{activite}"):
+        par_paroisse = format_bulletins == "paroisses"
+        try:
+            with st.spinner(f"Génération de {len(df_resultats)} bulletins en cours..."):
+                buffer = generer_bulletins(df_resultats, df_candidats, activite, par_paroisse=par_paroisse)
+        except Exception as e:
+            st.error(f"❌ Erreur lors de la génération des bulletins: {str(e)}")
+            return
+        if buffer is None:
+            st.info("Aucun résultat à imprimer")
+            return
+        annee = datetime.now().year
+        st.download_button(
+            label="📥 Télécharger les bulletins",
+            data=buffer,
+            file_name=f"bulletins_{activite}_{annee}.zip" if par_paroisse else f"bulletins_{activite}_{annee}.pdf",
+            mime="application/zip" if par_paroisse else "application/pdf",
+            key=f"telecharger_bulletins_{activite}",
+            on_click="ignore"
+        )
+
+def detecter_doublons(df):
+    """Détecter en une passe les doublons exacts, les variantes d'écriture et les inscriptions multi-grades"""
+    cles = cles_candidats(df['nom'], df['prenom'])
+    travail = pd.DataFrame({
+        'personne': pd.util.hash_array(cles.to_numpy(dtype=object)),
+        'brut': pd.util.hash_pandas_object(df[['nom', 'prenom', 'grade']], index=False).to_numpy(),
+        'grade': df['grade'].to_numpy()
+    }, index=df.index)
+    
+    exact = travail.duplicated('brut', keep=False)
+    variante = travail.groupby(['personne', 'grade'])['brut'].transform('nunique') > 1
+    multi_grade = travail.groupby('personne')['grade'].transform('nunique') > 1
+    
+    types = pd.Series('', index=df.index)
+    types[exact] += 'Doublon exact; '
+    types[variante] += "Variante d'écriture; "
+    types[multi_grade] += 'Inscrit dans plusieurs grades; '
+    
+    signales = types != ''
+    colonnes = [col for col in ['nom', 'prenom', 'grade', 'paroisse'] if col in df.columns]
+    rapport = df.loc[signales, colonnes].copy()
+    rapport.insert(0, 'type_doublon', types[signales].str.rstrip('; '))
+    rapport.insert(0, 'ligne', rapport.index + 2)  # Numéro de ligne Excel (en-tête en ligne 1)
+    rapport['groupe'] = travail.loc[signales, 'personne'].astype(str)
+    rapport = rapport.sort_values(['groupe', 'grade']).drop(columns='groupe')
+    
+    # Index (clé d'identité, grade) pour les contrôles d'existence en O(1)
+    index_candidats = set(zip(cles, df['grade']))
+    
+    return rapport, index_candidats
+
+@st.fragment
+def afficher_matricules_filtres(df_complet, activite):
+    """Tableau des matricules filtrable (fragment : un filtre ne relance que ce tableau)"""
+    col1, col2 = st.columns(2)
+    with col1:
+        grade_filtre = st.selectbox(
+            "Filtrer par grade:",
+            ["Tous"] + GRADES_ORDRE,
+            key=f"grade_{activite}"
+        )
+    with col2:
+        paroisse_filtre = st.selectbox(
+            "Filtrer par paroisse:",
+            ["Toutes"] + list(df_complet['paroisse'].unique()),
+            key=f"paroisse_{activite}"
+        )
+    
+    masque = pd.Series(True, index=df_complet.index)
+    if grade_filtre != "Tous":
+        masque &= df_complet['grade'] == grade_filtre
+    if paroisse_filtre != "Toutes":
+        masque &= df_complet['paroisse'] == paroisse_filtre
+    
+    st.dataframe(df_complet.loc[masque, ['matricule', 'nom', 'prenom', 'grade', 'paroisse', 'vicariat']], use_container_width=True)
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def construire_exports_matricules(_df_complet, empreinte):
+    """Fichiers de matricules (CSV, feuilles de notes Excel, liste PDF), construits une fois par version du roster"""
+    excel_buffer = generer_fichier_notes_excel(_df_complet)
+    pdf_buffer = generer_fichier_notes_pdf(_df_complet)
+    return (
+        _df_complet.to_csv(index=False),
+        excel_buffer.getvalue() if excel_buffer else None,
+        pdf_buffer.getvalue() if pdf_buffer else None
+    )
+
+def afficher_exports_matricules(df_complet, activite):
+    """Boutons de téléchargement des matricules (sans relance de l'application au clic)"""
+    csv, excel_data, pdf_data = construire_exports_matricules(df_complet, empreinte_resultats(df_complet))
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.download_button(
+            label="📥 Télécharger CSV",
+            data=csv,
+            file_name=f"matricules_{activite}_{datetime.now().year}.csv",
+            mime="text/csv",
+            on_click="ignore"
+        )
+    
+    with col2:
+        if excel_data:
+            st.download_button(
+                label="📊 Feuilles de notes Excel",
+                data=excel_data,
+                file_name=f"feuilles_notes_{activite}_{datetime.now().year}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                on_click="ignore"
+            )
+    
+    with col3:
+        if pdf_data:
+            st.download_button(
+                label="📄 Liste PDF complète",
+                data=pdf_data,
+                file_name=f"liste_matricules_{activite}_{datetime.now().year}.pdf",
+                mime="application/pdf",
+                on_click="ignore"
+            )
+
+def preparer_roster(fichier_candidats):
+    """Lire, normaliser et contrôler un fichier de candidats (résultat partagé entre les sessions)"""
+    # Ne lire que les colonnes utiles, en-têtes résolus par le schéma (variantes, casse, accents)
+    df_initial, correspondances = lire_tableau(
+        fichier_candidats,
+        SCHEMA_CANDIDATS,
+        dtypes=TYPES_CANDIDATS
+    )
+    
+    # Détecter et normaliser la colonne vicariat
+    journal = JournalImport()
+    df_initial = normaliser_colonne_vicariat(df_initial, journal)
+    
+    colonnes_requises = ['nom', 'prenom', 'grade', 'genre', 'date_naissance', 'paroisse']
+    roster = {
+        'journal': journal.entrees(),
+        'correspondances': correspondances,
+        'colonnes_manquantes': [col for col in colonnes_requises if col not in df_initial.columns],
+        'colonnes': list(df_initial.columns)
+    }
+    if roster['colonnes_manquantes']:
+        return roster
+    
+    # Nettoyer les données
+    df_initial = df_initial.dropna(subset=['nom', 'prenom', 'grade'])
+    df_initial['nom'] = df_initial['nom'].str.strip()
+    df_initial['prenom'] = df_initial['prenom'].str.strip()
+    df_initial['grade'] = df_initial['grade'].str.strip()
+    df_initial['paroisse'] = df_initial['paroisse'].str.strip()
+    
+    # Noms canoniques des paroisses et vicariats (registre de l'organisation)
+    registre = charger_registre_organisation()
+    df_initial['paroisse'] = registre.normaliser_paroisses(df_initial['paroisse'])
+    df_initial['vicariat'] = registre.normaliser_vicariats(df_initial['vicariat'])
+    vicariats_manquants = df_initial['vicariat'].isna() | (df_initial['vicariat'] == RegistreOrganisation.NON_SPECIFIE)
+    df_initial.loc[vicariats_manquants, 'vicariat'] = registre.vicariats_des_paroisses(df_initial.loc[vicariats_manquants, 'paroisse'])
+    roster['paroisses_inconnues'] = list(
+        df_initial.loc[~df_initial['paroisse'].isin(registre.vicariat_par_paroisse), 'paroisse'].dropna().unique()
+    )
+    
+    # Contrôle des doublons et conflits
+    rapport_doublons, index_candidats = detecter_doublons(df_initial)
+    roster.update(candidats=df_initial, doublons=rapport_doublons, index_candidats=frozenset(index_candidats))
+    return roster
+
 def importer_fichier_candidats(activite):
     """Importer le fichier des candidats avec gestion améliorée"""
     st.sidebar.header(f"📁 Import des Candidats")
@@ -1131,39 +3110,49 @@ def importer_fichier_candidats(activite):
     
     if fichier_candidats is not None:
         try:
-            # Utiliser des paramètres optimisés pour les gros fichiers
-            df_initial = pd.read_excel(
-                fichier_candidats, 
-                engine='openpyxl',
-                dtype={'nom': str, 'prenom': str, 'grade': str, 'genre': str, 'paroisse': str}
-            )
-            
-            # Nettoyer les noms de colonnes
-            df_initial.columns = df_initial.columns.str.strip()
-            
-            # Afficher les colonnes disponibles pour debug
-            st.sidebar.write(f"Colonnes détectées: {list(df_initial.columns)}")
-            
-            # Détecter et normaliser la colonne vicariat
-            df_initial = normaliser_colonne_vicariat(df_initial)
-            
-            colonnes_requises = ['nom', 'prenom', 'grade', 'genre', 'date_naissance', 'paroisse']
-            colonnes_manquantes = [col for col in colonnes_requises if col not in df_initial.columns]
-            
-            if colonnes_manquantes:
-                st.sidebar.error(f"Colonnes manquantes: {', '.join(colonnes_manquantes)}")
-                st.sidebar.info(f"Colonnes disponibles: {', '.join(df_initial.columns)}")
+            # Un seul import par contenu de fichier pour l'ensemble des sessions ouvertes
+            empreinte = empreinte_fichier(fichier_candidats)
+            roster = copie_session(cache_partage().obtenir(
+                ('roster', empreinte, activite),
+                lambda: preparer_roster(fichier_candidats)
+            ))
+            st.session_state[f'empreinte_candidats_{activite}'] = empreinte
+            
+            # Messages de l'import rejoués dans chaque session (le roster peut venir du cache partagé)
+            afficher_journal(roster['journal'], st.sidebar)
+            
+            # Afficher les colonnes retenues pour debug
+            correspondances = roster['correspondances']
+            st.sidebar.write(f"Colonnes détectées: {list(correspondances)}")
+            renommees = {col: can for col, can in correspondances.items() if col != can}
+            if renommees:
+                st.sidebar.info("Colonnes renommées: " + ", ".join(f"'{col}' → '{can}'" for col, can in renommees.items()))
+            
+            if roster['colonnes_manquantes']:
+                st.sidebar.error(f"Colonnes manquantes: {', '.join(roster['colonnes_manquantes'])}")
+                st.sidebar.info(f"Colonnes reconnues: {', '.join(roster['colonnes'])}")
                 return None
             
-            # Nettoyer les données
-            df_initial = df_initial.dropna(subset=['nom', 'prenom', 'grade'])
-            df_initial['nom'] = df_initial['nom'].str.strip()
-            df_initial['prenom'] = df_initial['prenom'].str.strip()
-            df_initial['grade'] = df_initial['grade'].str.strip()
-            df_initial['paroisse'] = df_initial['paroisse'].str.strip()
+            df_initial = roster['candidats']
+            if roster['paroisses_inconnues']:
+                st.sidebar.info(f"Paroisses absentes du registre: {', '.join(map(str, roster['paroisses_inconnues']))}")
                 
             st.sidebar.success(f"✅ {len(df_initial)} candidats importés")
             
+            rapport_doublons = roster['doublons']
+            st.session_state[f'index_candidats_{activite}'] = roster['index_candidats']
+            if not rapport_doublons.empty:
+                st.sidebar.warning(f"⚠️ {len(rapport_doublons)} ligne(s) en doublon ou en conflit")
+                with st.sidebar.expander("Doublons et conflits détectés"):
+                    st.dataframe(rapport_doublons, use_container_width=True)
+                    st.download_button(
+                        label="📥 Télécharger le rapport",
+                        data=rapport_doublons.to_csv(index=False),
+                        file_name=f"doublons_{activite}_{datetime.now().year}.csv",
+                        mime="text/csv",
+                        key=f"doublons_{activite}"
+                    )
+            
             # Détecter les vicariats automatiquement
             detecter_vicariats_automatiquement(df_initial)
             
@@ -1183,6 +3172,489 @@ def importer_fichier_candidats(activite):
     
     return None
 
+def afficher_anomalies_notes(anomalies, activite):
+    """Afficher et proposer au téléchargement le rapport d'anomalies des feuilles de notes"""
+    if anomalies is None or anomalies.empty:
+        st.success("✅ Aucune anomalie détectée dans les feuilles de notes")
+        return
+    
+    with st.expander(f"⚠️ {len(anomalies)} anomalie(s) détectée(s) dans les feuilles de notes"):
+        st.dataframe(anomalies['anomalie'].value_counts().rename('Nombre'), use_container_width=True)
+        st.dataframe(anomalies, use_container_width=True)
+        
+        buffer = BytesIO()
+        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+            anomalies.to_excel(writer, sheet_name='Anomalies', index=False)
+        buffer.seek(0)
+        st.download_button(
+            label="📥 Télécharger le rapport d'anomalies",
+            data=buffer,
+            file_name=f"anomalies_notes_{activite}_{datetime.now().year}.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            key=f"anomalies_{activite}"
+        )
+
+def afficher_ecarts_correcteurs(ecarts, activite):
+    """Afficher et proposer au téléchargement les écarts entre correcteurs"""
+    if ecarts is None or ecarts.empty:
+        st.success("✅ Aucun écart entre correcteurs au-delà de la tolérance")
+        return
+    
+    with st.expander(f"⚖️ {len(ecarts)} note(s) à vérifier entre correcteurs"):
+        st.dataframe(ecarts['statut'].value_counts().rename('Nombre'), use_container_width=True)
+        st.dataframe(ecarts, use_container_width=True)
+        
+        buffer = BytesIO()
+        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+            ecarts.to_excel(writer, sheet_name='Ecarts', index=False)
+        buffer.seek(0)
+        st.download_button(
+            label="📥 Télécharger les écarts entre correcteurs",
+            data=buffer,
+            file_name=f"ecarts_correcteurs_{activite}_{datetime.now().year}.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            key=f"ecarts_{activite}"
+        )
+
+def configurer_bareme(activite):
+    """Interface de configuration du barème (coefficients et seuils par grade)"""
+    cle = f'bareme_{activite}'
+    if cle not in st.session_state:
+        st.session_state[cle] = BaremeNotation.depuis_base()
+    bareme = st.session_state[cle]
+    
+    with st.expander("⚖️ Barème de notation"):
+        st.write("**Coefficients des compositions:**")
+        colonnes = st.columns(len(COLONNES_COMPOS))
+        coefficients = {}
+        for col_ui, compo in zip(colonnes, COLONNES_COMPOS):
+            with col_ui:
+                coefficients[compo] = st.number_input(
+                    compo, min_value=0.0, max_value=10.0, step=0.5,
+                    value=float(bareme.coefficients[compo]), key=f"coef_{compo}_{activite}"
+                )
+        
+        st.write("**Seuils de réussite par grade:**")
+        colonnes = st.columns(len(GRADES_ORDRE))
+        seuils = {}
+        for col_ui, grade in zip(colonnes, GRADES_ORDRE):
+            with col_ui:
+                seuils[grade] = st.number_input(
+                    grade, min_value=0.0, max_value=20.0, step=0.25,
+                    value=float(bareme.seuils_reussite[grade]), key=f"seuil_{grade}_{activite}"
+                )
+        
+        if sum(coefficients.values()) == 0:
+            st.error("Au moins un coefficient doit être non nul")
+        else:
+            bareme = BaremeNotation(coefficients, seuils, seuils_mentions=bareme.seuils_mentions)
+            st.session_state[cle] = bareme
+        
+        if st.button("💾 Enregistrer les coefficients comme barème par défaut", key=f"enregistrer_bareme_{activite}"):
+            bareme.enregistrer_coefficients()
+            st.success("✅ Coefficients enregistrés")
+    
+    return bareme
+
+def initialiser_table_resumes(chemin_base=CHEMIN_BASE):
+    """Créer la table des résumés annuels de résultats si elle n'existe pas"""
+    with connexion_base(chemin_base) as conn, conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS resumes_resultats (
+                annee INTEGER NOT NULL,
+                activite TEXT NOT NULL,
+                grade TEXT NOT NULL,
+                vicariat TEXT NOT NULL,
+                effectif INTEGER NOT NULL,
+                admis INTEGER NOT NULL,
+                somme_moyennes REAL NOT NULL,
+                created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (annee, activite, grade, vicariat)
+            )
+        """)
+
+@st.cache_resource(show_spinner=False)
+def initialiser_table_notes(chemin_base=CHEMIN_BASE):
+    """Créer une seule fois par processus la table des notes saisies"""
+    with connexion_base(chemin_base) as conn, conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS notes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                matricule TEXT NOT NULL,
+                code_matiere TEXT NOT NULL,
+                note REAL NOT NULL,
+                exam_session TEXT NOT NULL,
+                created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (matricule) REFERENCES etudiants (matricule),
+                FOREIGN KEY (code_matiere) REFERENCES matieres (code_matiere),
+                CHECK (note >= 0 AND note <= 20)
+            )
+        """)
+    return True
+
+def session_examen(activite, annee=None):
+    """Identifiant de session des notes saisies (activité et année)"""
+    return f"{activite}_{annee or datetime.now().year}"
+
+def enregistrer_notes_saisies(matricule, notes, activite, annee=None, chemin_base=CHEMIN_BASE):
+    """Enregistrer les notes saisies d'un candidat {COMPOn: valeur} ; une valeur None efface la saisie"""
+    session = session_examen(activite, annee)
+    initialiser_table_notes(chemin_base)
+    with connexion_base(chemin_base) as conn, conn:
+        for col, valeur in notes.items():
+            code = col.replace('COMPO', 'COMP')
+            conn.execute(
+                "DELETE FROM notes WHERE matricule = ? AND code_matiere = ? AND exam_session = ?",
+                (matricule, code, session)
+            )
+            if valeur is not None:
+                conn.execute(
+                    "INSERT INTO notes (matricule, code_matiere, note, exam_session) VALUES (?, ?, ?, ?)",
+                    (matricule, code, float(valeur), session)
+                )
+
+def charger_notes_saisies(activite, annee=None, chemin_base=CHEMIN_BASE):
+    """Charger les notes saisies d'une activité pour une année"""
+    initialiser_table_notes(chemin_base)
+    with connexion_base(chemin_base) as conn:
+        return pd.read_sql_query(
+            "SELECT matricule, code_matiere, note FROM notes WHERE exam_session = ? AND code_matiere LIKE 'COMP%' ORDER BY id",
+            conn,
+            params=(session_examen(activite, annee),)
+        )
+
+def etat_notes_saisies(activite, annee=None, chemin_base=CHEMIN_BASE):
+    """Marqueur des notes saisies d'une session (nombre, dernier identifiant) : change à chaque saisie ou effacement"""
+    initialiser_table_notes(chemin_base)
+    with connexion_base(chemin_base) as conn:
+        return conn.execute(
+            "SELECT COUNT(*), MAX(id) FROM notes WHERE exam_session = ?",
+            (session_examen(activite, annee),)
+        ).fetchone()
+
+def supprimer_notes_saisies(activite, annee=None, chemin_base=CHEMIN_BASE):
+    """Abandonner toutes les notes saisies d'une activité pour une année (retour aux notes du fichier)"""
+    initialiser_table_notes(chemin_base)
+    with connexion_base(chemin_base) as conn, conn:
+        return conn.execute("DELETE FROM notes WHERE exam_session = ?", (session_examen(activite, annee),)).rowcount
+
+def obtenir_grille_notation(df_base, df_candidats, correcteur, activite, cle_base, notes_en_attente=None):
+    """Grille de saisie de la session, reconstruite si les notes importées, le roster, le barème ou les notes saisies changent"""
+    cle = f'grille_notes_{activite}'
+    etat = etat_notes_saisies(activite)
+    # Les saisies de cette session mettent l'état à jour elles-mêmes : seules celles d'une autre session reconstruisent la grille
+    if st.session_state.get(f'{cle}_base') != cle_base or st.session_state.get(f'{cle}_etat') != etat:
+        grille = GrilleNotation(df_base, df_candidats, correcteur, notes_en_attente)
+        grille.appliquer_saisies(charger_notes_saisies(activite))
+        st.session_state[cle] = grille
+        st.session_state[f'{cle}_base'] = cle_base
+        st.session_state[f'{cle}_etat'] = etat
+    return st.session_state[cle]
+
+@st.fragment
+def afficher_grille_notation(grille, activite):
+    """Grille éditable des compositions d'un grade (fragment : une saisie ne relance que la grille et ne reclasse que le candidat modifié)"""
+    st.subheader("✏️ Saisie et correction des notes")
+    grades = [g for g in GRADES_ORDRE if g in grille.classements]
+    if not grades:
+        st.info("ℹ️ Aucun candidat à noter")
+        return
+    a_arbitrer = sorted(m for m in grille.en_attente if grille.table.at[m, 'decision'] == DECISION_ARBITRAGE)
+    if a_arbitrer:
+        st.warning(f"⚖️ {len(a_arbitrer)} candidat(s) en attente d'arbitrage (décision « {DECISION_ARBITRAGE} ») : saisir la note arbitrée des compositions disputées")
+    grade = st.selectbox("Grade à saisir:", grades, key=f"grade_saisie_{activite}")
+    df_grade = grille.grade(grade)
+    version = st.session_state.get(f'version_grille_{activite}', 0)
+    cle_editeur = f"grille_notes_{activite}_{grade}_{version}"
+    
+    def appliquer_saisie():
+        modifications = st.session_state[cle_editeur]['edited_rows']
+        for position, notes in modifications.items():
+            notes = {col: valeur for col, valeur in notes.items() if col in COLONNES_COMPOS}
+            if notes:
+                matricule = df_grade.at[int(position), 'matricule']
+                grille.modifier(matricule, notes)
+                enregistrer_notes_saisies(matricule, notes, activite)
+        st.session_state[f'grille_notes_{activite}_etat'] = etat_notes_saisies(activite)
+        st.session_state[f'version_grille_{activite}'] = version + 1
+    
+    st.data_editor(
+        df_grade,
+        key=cle_editeur,
+        on_change=appliquer_saisie,
+        hide_index=True,
+        use_container_width=True,
+        disabled=[col for col in df_grade.columns if col not in COLONNES_COMPOS],
+        column_config={
+            col: st.column_config.NumberColumn(col, min_value=0.0, max_value=20.0, step=0.25, format="%.2f")
+            for col in COLONNES_COMPOS
+        } | {
+            'moyenne': st.column_config.NumberColumn("moyenne", format="%.2f"),
+            'saisies': st.column_config.TextColumn("saisies", help="Compositions dont la note saisie remplace celle du fichier")
+        }
+    )
+    st.caption(
+        "Les notes saisies sont enregistrées aussitôt et priment sur le fichier importé ; effacer une cellule rétablit la note du fichier. "
+        "Les résultats et le tableau de bord suivent au prochain rafraîchissement de la page."
+    )
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("🔄 Actualiser les résultats", key=f"actualiser_grille_{activite}"):
+            st.rerun()
+    with col2:
+        if grille.saisies and st.button(f"🗑️ Abandonner les {len(grille.saisies)} note(s) saisie(s)", key=f"abandonner_saisies_{activite}"):
+            supprimer_notes_saisies(activite)
+            st.rerun()
+
+def calculer_resume_resultats(df_resultats):
+    """Résumer des résultats par grade et vicariat (effectif, admis, somme des moyennes)"""
+    travail = pd.DataFrame({
+        'grade': df_resultats['grade'].fillna("Non spécifié"),
+        'vicariat': df_resultats['vicariat'].fillna("Non spécifié"),
+        'admis': df_resultats['decision'].isin(DECISIONS_ADMIS).astype(int),
+        'moyenne': pd.to_numeric(df_resultats['moyenne'], errors='coerce')
+    })
+    # Les sommes (et non les moyennes) permettent de réagréger exactement par grade ou par vicariat
+    return travail.groupby(['grade', 'vicariat'], as_index=False).agg(
+        effectif=('moyenne', 'count'),
+        admis=('admis', 'sum'),
+        somme_moyennes=('moyenne', 'sum')
+    )
+
+def enregistrer_resume_resultats(df_resultats, activite, annee=None, chemin_base=CHEMIN_BASE):
+    """Enregistrer (ou remplacer) le résumé des résultats d'une activité pour une année"""
+    annee = annee or datetime.now().year
+    resume = calculer_resume_resultats(df_resultats)
+    initialiser_table_resumes(chemin_base)
+    with connexion_base(chemin_base) as conn, conn:
+        conn.execute("DELETE FROM resumes_resultats WHERE annee = ? AND activite = ?", (int(annee), activite))
+        conn.executemany(
+            "INSERT INTO resumes_resultats (annee, activite, grade, vicariat, effectif, admis, somme_moyennes) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(int(annee), activite, g, v, int(e), int(a), float(m)) for g, v, e, a, m in resume.itertuples(index=False, name=None)]
+        )
+    return resume
+
+def charger_resumes_resultats(chemin_base=CHEMIN_BASE):
+    """Charger tous les résumés annuels enregistrés"""
+    initialiser_table_resumes(chemin_base)
+    with connexion_base(chemin_base) as conn:
+        return pd.read_sql_query(
+            "SELECT annee, activite, grade, vicariat, effectif, admis, somme_moyennes FROM resumes_resultats",
+            conn
+        )
+
+def initialiser_table_versions(chemin_base=CHEMIN_BASE):
+    """Créer la table des versions de résultats si elle n'existe pas"""
+    with connexion_base(chemin_base) as conn, conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS versions_resultats (
+                activite TEXT NOT NULL,
+                empreinte TEXT NOT NULL,
+                annee INTEGER NOT NULL,
+                effectif INTEGER NOT NULL,
+                admis INTEGER NOT NULL,
+                donnees BLOB NOT NULL,
+                created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (activite, empreinte)
+            )
+        """)
+
+def enregistrer_version_resultats(df_resultats, activite, empreinte=None, annee=None, chemin_base=CHEMIN_BASE):
+    """Conserver une version des résultats, adressée par son contenu (une version existante n'est jamais réécrite)"""
+    empreinte = empreinte or empreinte_resultats(df_resultats)
+    initialiser_table_versions(chemin_base)
+    with connexion_base(chemin_base) as conn, conn:
+        if conn.execute(
+            "SELECT 1 FROM versions_resultats WHERE activite = ? AND empreinte = ?", (activite, empreinte)
+        ).fetchone():
+            return empreinte
+        donnees = zlib.compress(df_resultats.reset_index(drop=True).to_json(orient='columns', force_ascii=False).encode('utf-8'))
+        conn.execute(
+            "INSERT OR IGNORE INTO versions_resultats (activite, empreinte, annee, effectif, admis, donnees) VALUES (?, ?, ?, ?, ?, ?)",
+            (activite, empreinte, int(annee or datetime.now().year), len(df_resultats),
+             int(df_resultats['decision'].isin(DECISIONS_ADMIS).sum()), sqlite3.Binary(donnees))
+        )
+    return empreinte
+
+def lister_versions_resultats(activite, chemin_base=CHEMIN_BASE):
+    """Versions enregistrées d'une activité, de la plus récente à la plus ancienne"""
+    initialiser_table_versions(chemin_base)
+    with connexion_base(chemin_base) as conn:
+        return pd.read_sql_query(
+            "SELECT empreinte, annee, effectif, admis, created_date FROM versions_resultats WHERE activite = ? ORDER BY created_date DESC, rowid DESC",
+            conn,
+            params=(activite,)
+        )
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def charger_version_resultats(activite, empreinte, chemin_base=CHEMIN_BASE):
+    """Relire une version des résultats (immuable : mise en cache sans invalidation)"""
+    with connexion_base(chemin_base) as conn:
+        ligne = conn.execute(
+            "SELECT donnees FROM versions_resultats WHERE activite = ? AND empreinte = ?", (activite, empreinte)
+        ).fetchone()
+    if ligne is None:
+        return pd.DataFrame(columns=GrilleNotation.COLONNES_RESULTATS)
+    return pd.read_json(StringIO(zlib.decompress(ligne[0]).decode('utf-8')), orient='columns', dtype=False, convert_dates=False)
+
+def comparer_versions(avant, apres):
+    """Écarts entre deux versions alignées sur le matricule : moyennes modifiées, rangs déplacés, décisions inversées"""
+    colonnes = ['nom', 'prenom', 'grade', 'moyenne', 'rang', 'decision']
+    # Une version vide (ou illisible) compte comme une version sans candidat
+    avant, apres = (df.reindex(columns=['matricule'] + colonnes).set_index('matricule') for df in (avant, apres))
+    a, b = avant.align(apres, join='outer')
+    # Le rang est toujours renseigné dans une version : absent après alignement = candidat absent de la version
+    dans_avant = a['rang'].notna().to_numpy()
+    dans_apres = b['rang'].notna().to_numpy()
+    communs = dans_avant & dans_apres
+    
+    moyenne_avant = a['moyenne'].to_numpy(dtype=np.float64)
+    moyenne_apres = b['moyenne'].to_numpy(dtype=np.float64)
+    rang_avant = a['rang'].to_numpy(dtype=np.float64)
+    rang_apres = b['rang'].to_numpy(dtype=np.float64)
+    moyenne_modifiee = communs & ~np.isclose(moyenne_avant, moyenne_apres, atol=0.005, equal_nan=True)
+    rang_modifie = communs & (rang_avant != rang_apres)
+    decision_inversee = communs & (a['decision'].to_numpy() != b['decision'].to_numpy())
+    
+    ecarts = b[['nom', 'prenom', 'grade']].combine_first(a[['nom', 'prenom', 'grade']])
+    ecarts['moyenne_avant'] = moyenne_avant
+    ecarts['moyenne_apres'] = moyenne_apres
+    ecarts['ecart_moyenne'] = np.round(moyenne_apres - moyenne_avant, 2)
+    ecarts['rang_avant'] = a['rang'].astype('Int64')
+    ecarts['rang_apres'] = b['rang'].astype('Int64')
+    ecarts['places_gagnees'] = pd.array(rang_avant - rang_apres, dtype='Int64')
+    ecarts['decision_avant'] = a['decision']
+    ecarts['decision_apres'] = b['decision']
+    ecarts['statut'] = np.select(
+        [~dans_avant, ~dans_apres, decision_inversee, moyenne_modifiee, rang_modifie],
+        ["Ajouté", "Retiré", "Décision inversée", "Moyenne modifiée", "Rang déplacé"],
+        default=""
+    )
+    ecarts = ecarts[ecarts['statut'] != ""].rename_axis('matricule').reset_index()
+    return ecarts
+
+def afficher_versions_resultats(activite):
+    """Historique des versions proclamées et écarts entre deux versions"""
+    versions = lister_versions_resultats(activite)
+    if len(versions) < 2:
+        st.info("ℹ️ Les écarts seront disponibles dès que deux versions des résultats auront été figées")
+        if not versions.empty:
+            st.dataframe(versions, use_container_width=True, hide_index=True)
+        return
+    
+    st.dataframe(versions, use_container_width=True, hide_index=True)
+    libelles = dict(zip(
+        versions['empreinte'],
+        versions['created_date'].astype(str) + " - " + versions['empreinte'] + " (" + versions['effectif'].astype(str) + " candidats)"
+    ))
+    col1, col2 = st.columns(2)
+    with col1:
+        version_avant = st.selectbox("Version de référence:", list(libelles), index=1, format_func=libelles.get, key=f"version_avant_{activite}")
+    with col2:
+        version_apres = st.selectbox("Version comparée:", list(libelles), index=0, format_func=libelles.get, key=f"version_apres_{activite}")
+    
+    ecarts = comparer_versions(
+        charger_version_resultats(activite, version_avant),
+        charger_version_resultats(activite, version_apres)
+    )
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Moyennes modifiées", int(ecarts['ecart_moyenne'].fillna(0).ne(0).sum()))
+    with col2:
+        st.metric("Rangs déplacés", int(ecarts['places_gagnees'].fillna(0).ne(0).sum()))
+    with col3:
+        st.metric("Décisions inversées", int((ecarts['statut'] == "Décision inversée").sum()))
+    with col4:
+        st.metric("Ajoutés / retirés", int(ecarts['statut'].isin(["Ajouté", "Retiré"]).sum()))
+    
+    if ecarts.empty:
+        st.success("✅ Aucune différence entre les deux versions")
+        return
+    st.dataframe(ecarts, use_container_width=True, hide_index=True)
+    st.download_button(
+        label="📥 Télécharger les écarts (CSV)",
+        data=ecarts.to_csv(index=False).encode('utf-8-sig'),
+        file_name=f"ecarts_versions_{activite}_{version_avant}_{version_apres}.csv",
+        mime="text/csv",
+        key=f"ecarts_versions_{activite}"
+    )
+
+def afficher_comparaison_historique():
+    """Comparer les résultats de plusieurs années et des deux activités"""
+    st.header("📅 Comparaison Pluriannuelle")
+    
+    with st.expander("➕ Ajouter les résultats d'une année précédente"):
+        col1, col2 = st.columns(2)
+        with col1:
+            annee_import = st.number_input("Année", min_value=2000, max_value=datetime.now().year, value=datetime.now().year - 1, step=1)
+        with col2:
+            activite_import = st.selectbox(
+                "Activité",
+                ["weekend", "session"],
+                format_func=lambda x: "Week-end de Formation" if x == "weekend" else "Session Diocésaine"
+            )
+        fichier_historique = st.file_uploader(
+            "Fichier de résultats exporté (CSV ou Excel)",
+            type=['csv', 'xlsx'],
+            key="resultats_historiques",
+            help="Colonnes requises: grade, vicariat, moyenne, decision"
+        )
+        if fichier_historique is not None and st.button("Enregistrer le résumé"):
+            try:
+                df_historique, _ = lire_tableau(fichier_historique, SCHEMA_RESULTATS, dtypes=TYPES_RESULTATS)
+                resume = enregistrer_resume_resultats(df_historique, activite_import, annee_import)
+                st.success(f"✅ Résumé {activite_import} {annee_import} enregistré ({int(resume['effectif'].sum())} candidats)")
+            except Exception as e:
+                st.error(f"Erreur lors de l'enregistrement: {e}")
+    
+    resumes = charger_resumes_resultats()
+    if resumes.empty:
+        st.info("ℹ️ Aucun résultat enregistré. Les résultats sont archivés à chaque correction.")
+        return
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        annees = sorted(resumes['annee'].unique())
+        annees_selectionnees = st.multiselect("Années:", annees, default=annees)
+    with col2:
+        activites = sorted(resumes['activite'].unique())
+        activites_selectionnees = st.multiselect("Activités:", activites, default=activites)
+    with col3:
+        axe = st.radio("Comparer par:", ['grade', 'vicariat'], format_func=str.capitalize, horizontal=True)
+    
+    resumes = resumes[resumes['annee'].isin(annees_selectionnees) & resumes['activite'].isin(activites_selectionnees)]
+    if resumes.empty:
+        st.info("Aucune donnée pour cette sélection")
+        return
+    
+    tendances = resumes.groupby(['activite', 'annee', axe], as_index=False)[['effectif', 'admis', 'somme_moyennes']].sum()
+    tendances['Taux de réussite (%)'] = (tendances['admis'] / tendances['effectif'] * 100).round(1)
+    tendances['Moyenne'] = (tendances['somme_moyennes'] / tendances['effectif']).round(2)
+    
+    for activite in activites_selectionnees:
+        df_activite = tendances[tendances['activite'] == activite]
+        if df_activite.empty:
+            continue
+        st.subheader("🎯 Week-end de Formation" if activite == "weekend" else "📚 Session Diocésaine")
+        
+        for indicateur in ['Taux de réussite (%)', 'Moyenne']:
+            pivot = df_activite.pivot(index='annee', columns=axe, values=indicateur)
+            if axe == 'grade':
+                pivot = pivot.reindex(columns=[g for g in GRADES_ORDRE if g in pivot.columns])
+            
+            st.write(f"**{indicateur} par {axe}:**")
+            st.dataframe(pivot, use_container_width=True)
+            
+            donnees = df_activite[['annee', axe, indicateur]].rename(columns={'annee': 'Année', axe: axe.capitalize()})
+            st.altair_chart(alt.Chart(donnees).mark_line(point=True).encode(
+                x=alt.X('Année:O'),
+                y=alt.Y(f'{indicateur}:Q'),
+                color=alt.Color(f'{axe.capitalize()}:N', sort=list(pivot.columns)),
+                tooltip=['Année', axe.capitalize(), indicateur]
+            ).properties(title=f"{indicateur} par {axe} et par année", height=300), use_container_width=True)
+
 def main():
     # Afficher le logo
     afficher_logo()
@@ -1213,16 +3685,27 @@ def main():
             st.info("📋 Veuillez importer le fichier des candidats pour le Week-end de Formation")
         else:
             st.info("📋 Veuillez importer le fichier des candidats pour la Session Diocésaine")
+        # L'historique ne lit que la base SQLite : consultable sans fichier de candidats
+        afficher_comparaison_historique()
         return
     
-    # Générer les matricules
-    df_matricules = assigner_matricules(df_initial)
-    df_complet = pd.merge(df_initial, df_matricules, on=['nom', 'prenom', 'grade'])
+    # Générer les matricules (séquences persistées) et réintégrer les candidats tardifs
+    allocateur = AllocateurMatricules(activite)
+    df_complet = copie_session(cache_partage().obtenir(
+        ('matricules', st.session_state[f'empreinte_candidats_{activite}'], activite, allocateur.annee),
+        lambda: pd.merge(df_initial, assigner_matricules(df_initial, allocateur), on=['nom', 'prenom', 'grade'])
+    ))
+    df_complet = integrer_candidats_tardifs(df_complet, allocateur, st.session_state.get(f'index_candidats_{activite}'))
     
     # Afficher les statistiques d'import
     st.sidebar.write(f"**Candidats uniques:** {len(df_complet)}")
     st.sidebar.write(f"**Grades:** {df_complet['grade'].nunique()}")
     st.sidebar.write(f"**Vicariats:** {df_complet['vicariat'].nunique()}")
+    occupation = cache_partage().statistiques()
+    st.sidebar.caption(
+        f"Cache partagé: {occupation['entrees']} élément(s), "
+        f"{occupation['taille_mo']:.1f} / {occupation['taille_max_mo']:.0f} Mo"
+    )
     
     # Vérifier la présence de vicariat
     if 'vicariat' not in df_complet.columns:
@@ -1237,7 +3720,7 @@ def main():
     tableau_bord.afficher_entete_activite()
     
     # Onglets
-    tab1, tab2, tab3, tab4 = st.tabs(["📊 Vue d'ensemble", "🎫 Matricules", "📝 Correction", "🏆 Résultats"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 Vue d'ensemble", "🎫 Matricules", "📝 Correction", "🏆 Résultats", "📅 Historique"])
     
     with tab1:
         st.header("Vue d'ensemble des Candidats")
@@ -1262,63 +3745,15 @@ def main():
         
         # Section pour ajouter des candidats en retard
         with st.expander("➕ Ajouter un candidat en retard"):
-            df_complet = ajouter_candidat_manuel(df_complet)
-        
-        st.write(f"**Total: {len(df_complet)} candidats**")
-        
-        col1, col2 = st.columns(2)
-        with col1:
-            grade_filtre = st.selectbox(
-                "Filtrer par grade:",
-                ["Tous"] + GRADES_ORDRE,
-                key=f"grade_{activite}"
-            )
-        with col2:
-            paroisse_filtre = st.selectbox(
-                "Filtrer par paroisse:",
-                ["Toutes"] + list(df_complet['paroisse'].unique()),
-                key=f"paroisse_{activite}"
-            )
+            df_complet = ajouter_candidat_manuel(df_complet, allocateur, st.session_state.get(f'index_candidats_{activite}'))
         
-        df_filtre = df_complet.copy()
-        if grade_filtre != "Tous":
-            df_filtre = df_filtre[df_filtre['grade'] == grade_filtre]
-        if paroisse_filtre != "Toutes":
-            df_filtre = df_filtre[df_filtre['paroisse'] == paroisse_filtre]
-        
-        st.dataframe(df_filtre[['matricule', 'nom', 'prenom', 'grade', 'paroisse', 'vicariat']], use_container_width=True)
-        
-        # Boutons de téléchargement
-        col1, col2, col3 = st.columns(3)
+        with st.expander("📥 Importer une liste de candidats en retard"):
+            df_complet = importer_candidats_tardifs_en_lot(df_complet, allocateur, st.session_state.get(f'index_candidats_{activite}'))
         
-        with col1:
-            csv = df_complet.to_csv(index=False)
-            st.download_button(
-                label="📥 Télécharger CSV",
-                data=csv,
-                file_name=f"matricules_{activite}_{datetime.now().year}.csv",
-                mime="text/csv"
-            )
-        
-        with col2:
-            excel_buffer = generer_fichier_notes_excel(df_complet)
-            if excel_buffer:
-                st.download_button(
-                    label="📊 Feuilles de notes Excel",
-                    data=excel_buffer,
-                    file_name=f"feuilles_notes_{activite}_{datetime.now().year}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
+        st.write(f"**Total: {len(df_complet)} candidats**")
         
-        with col3:
-            pdf_buffer = generer_fichier_notes_pdf(df_complet)
-            if pdf_buffer:
-                st.download_button(
-                    label="📄 Liste PDF complète",
-                    data=pdf_buffer,
-                    file_name=f"liste_matricules_{activite}_{datetime.now().year}.pdf",
-                    mime="application/pdf"
-                )
+        afficher_matricules_filtres(df_complet, activite)
+        afficher_exports_matricules(df_complet, activite)
     
     with tab3:
         st.header("📝 Correction des Copies")
@@ -1326,21 +3761,89 @@ def main():
         st.info("""
         **Import des Notes - Format requis:**
         - Fichier Excel avec les colonnes: `matricule`, `COMPO1`, `COMPO2`, `COMPO3`, `COMPO4`, `COMPO5`
+        - À défaut de `matricule`, les colonnes `nom` et `prenom` permettent de retrouver le candidat (tolérance aux fautes de frappe)
         - **Le système lit maintenant TOUTES les feuilles du fichier Excel**
         - **Capacité augmentée** - Gestion des fichiers volumineux
-        - Le système calculera automatiquement la moyenne des 5 compositions
+        - Le système calculera automatiquement la moyenne des 5 compositions, pondérée selon le barème
         """)
         
-        fichier_notes = st.file_uploader(
-            f"Choisir le fichier Excel des notes", 
-            type=['xlsx'],
-            key=f"notes_{activite}",
-            help="Taille maximale: 200MB. Supporte les fichiers avec plusieurs feuilles"
+        double_correction = st.toggle(
+            "Double correction (rapprocher les classeurs de plusieurs correcteurs)",
+            key=f"double_correction_{activite}"
         )
+        if double_correction:
+            fichiers_notes = st.file_uploader(
+                "Choisir les classeurs des correcteurs (un fichier Excel par correcteur)",
+                type=['xlsx'],
+                accept_multiple_files=True,
+                key=f"notes_correcteurs_{activite}"
+            ) or []
+            col1, col2 = st.columns(2)
+            with col1:
+                tolerance = st.number_input(
+                    "Écart toléré entre correcteurs (points):", min_value=0.0, max_value=20.0, value=2.0, step=0.5,
+                    key=f"tolerance_correcteurs_{activite}"
+                )
+            with col2:
+                politique = st.selectbox(
+                    "Note retenue en cas de désaccord:",
+                    list(CorrecteurCompositions.POLITIQUES_DESACCORD),
+                    format_func=CorrecteurCompositions.POLITIQUES_DESACCORD.get,
+                    key=f"politique_desaccord_{activite}"
+                )
+            if len(fichiers_notes) == 1:
+                st.info("ℹ️ Ajoutez au moins un second classeur pour rapprocher les notes")
+            identifiant_notes = (tuple(f.file_id for f in fichiers_notes), tolerance, politique) if len(fichiers_notes) >= 2 else None
+        else:
+            fichier_notes = st.file_uploader(
+                f"Choisir le fichier Excel des notes", 
+                type=['xlsx'],
+                key=f"notes_{activite}",
+                help="Taille maximale: 200MB. Supporte les fichiers avec plusieurs feuilles"
+            )
+            identifiant_notes = fichier_notes.file_id if fichier_notes is not None else None
+        
+        bareme = configurer_bareme(activite)
+        mode_classement = st.selectbox(
+            "Mode de classement des ex aequo:",
+            list(CorrecteurCompositions.MODES_CLASSEMENT),
+            format_func=CorrecteurCompositions.MODES_CLASSEMENT.get,
+            key=f"mode_classement_{activite}"
+        )
+        
+        correcteur = CorrecteurCompositions(activite, bareme, mode_classement)
+        empreinte_roster = empreinte_resultats(df_complet)
+        df_base, empreinte_base, notes_en_attente = pd.DataFrame(), None, None
         
-        if fichier_notes is not None:
-            correcteur = CorrecteurCompositions(activite)
-            notes_df = correcteur.importer_notes(fichier_notes)
+        if identifiant_notes is not None:
+            # Les notes ne sont relues que si le fichier change : un nouveau barème recalcule seulement les résultats.
+            # Le même fichier ouvert par plusieurs organisateurs n'est importé qu'une fois (cache partagé).
+            if st.session_state.get(f'fichier_notes_id_{activite}') != identifiant_notes:
+                if double_correction:
+                    empreinte_notes = (tuple(empreinte_fichier(f) for f in fichiers_notes), tolerance, politique)
+                    notes_importees, ecarts, anomalies, journal = copie_session(cache_partage().obtenir(
+                        ('double_correction', empreinte_notes, activite, empreinte_roster),
+                        lambda: correcteur.importer_double_correction(fichiers_notes, df_complet, tolerance, politique)
+                        + (correcteur.anomalies_notes, correcteur.journal.entrees())
+                    ))
+                else:
+                    empreinte_notes = empreinte_fichier(fichier_notes)
+                    notes_importees, anomalies, journal = copie_session(cache_partage().obtenir(
+                        ('notes', empreinte_notes, activite, empreinte_roster),
+                        lambda: (correcteur.importer_notes(fichier_notes, df_complet), correcteur.anomalies_notes, correcteur.journal.entrees())
+                    ))
+                    ecarts = None
+                # Messages de l'import affichés dans chaque session, même lorsque les notes viennent du cache partagé
+                afficher_journal(journal)
+                st.session_state[f'notes_df_{activite}'] = notes_importees
+                st.session_state[f'anomalies_notes_{activite}'] = anomalies
+                st.session_state[f'ecarts_correcteurs_{activite}'] = ecarts
+                st.session_state[f'empreinte_notes_{activite}'] = (empreinte_notes, empreinte_roster)
+                st.session_state[f'fichier_notes_id_{activite}'] = identifiant_notes
+            notes_df = st.session_state[f'notes_df_{activite}']
+            afficher_anomalies_notes(st.session_state.get(f'anomalies_notes_{activite}'), activite)
+            if double_correction:
+                afficher_ecarts_correcteurs(st.session_state.get(f'ecarts_correcteurs_{activite}'), activite)
             
             if not notes_df.empty:
                 st.success(f"✅ Fichier importé: {len(notes_df)} notes valides")
@@ -1350,22 +3853,57 @@ def main():
                 
                 correcteur.afficher_analyse_notes(notes_df)
                 
-                df_resultats = correcteur.proclamer_resultats(notes_df, df_complet)
-                st.session_state[f'df_resultats_{activite}'] = df_resultats
-                
-                st.success("✅ Correction terminée !")
-                st.write("**Résultats de la correction:**")
-                st.dataframe(df_resultats, use_container_width=True)
+                empreinte_base = st.session_state[f'empreinte_notes_{activite}']
+                if 'arbitrage' in notes_df.columns:
+                    notes_en_attente = notes_df[notes_df['arbitrage'] != '']
+                df_base = copie_session(cache_partage().obtenir(
+                    ('resultats', empreinte_base, activite, empreinte_roster,
+                     correcteur.bareme.signature(), mode_classement),
+                    lambda: correcteur.proclamer_resultats(notes_df, df_complet)
+                ))
+        
+        # Les saisies de la grille complètent ou corrigent les notes du fichier sans relancer la proclamation
+        grille = obtenir_grille_notation(
+            df_base, df_complet, correcteur, activite,
+            (empreinte_base, empreinte_roster, correcteur.bareme.signature(), mode_classement),
+            notes_en_attente
+        )
+        afficher_grille_notation(grille, activite)
+        df_resultats = grille.resultats()
+        st.session_state[f'df_resultats_{activite}'] = df_resultats
+        
+        if not df_resultats.empty:
+            # Résumé réécrit seulement lorsque les résultats changent
+            if st.session_state.get(f'resume_resultats_{activite}') != grille.empreinte:
+                enregistrer_resume_resultats(df_resultats, activite)
+                st.session_state[f'resume_resultats_{activite}'] = grille.empreinte
+            
+            st.success("✅ Correction terminée !")
+            st.write("**Résultats de la correction:**")
+            st.dataframe(df_resultats, use_container_width=True)
+            
+            # Une version n'est conservée que sur décision explicite (une seule écriture par contenu)
+            if st.button("📌 Proclamer / figer cette version des résultats", key=f"figer_version_{activite}"):
+                enregistrer_version_resultats(df_resultats, activite, grille.empreinte)
+                st.success(f"✅ Version {grille.empreinte} figée")
+            
+            AnalyseCompositions(df_resultats).afficher()
+        
+        with st.expander("🕓 Versions des résultats et écarts entre corrections"):
+            afficher_versions_resultats(activite)
     
     with tab4:
         st.header("🏆 Proclamation des Résultats")
         
         if f'df_resultats_{activite}' in st.session_state and not st.session_state[f'df_resultats_{activite}'].empty:
             df_resultats = st.session_state[f'df_resultats_{activite}']
-            tableau_bord_resultats = TableauBordCompositions(df_complet, df_resultats, activite)
+            tableau_bord_resultats = TableauBordCompositions(df_complet, df_resultats, activite, bareme)
             
             tableau_bord_resultats.afficher_kpis()
             tableau_bord_resultats.afficher_resultats_par_grade()
+            tableau_bord_resultats.afficher_distributions()
+            tableau_bord_resultats.afficher_simulateur_seuil()
+            tableau_bord_resultats.afficher_palmares()
             tableau_bord_resultats.afficher_classement()
             
             st.subheader("📤 Export des Résultats")
@@ -1410,8 +3948,61 @@ def main():
                         )
                     else:
                         st.error("❌ Erreur lors de la génération du rapport PDF")
+            
+            if st.button("🗂️ Générer les dossiers par vicariat (ZIP)", key=f"packs_{activite}"):
+                with st.spinner("Génération des dossiers par vicariat en cours..."):
+                    chemin_packs = tableau_bord_resultats.generer_packs_vicariats()
+                try:
+                    taille_packs = os.path.getsize(chemin_packs)
+                    if taille_packs > TAILLE_MAX_TELECHARGEMENT_MO * 1024 * 1024:
+                        st.error(
+                            f"❌ Archive de {taille_packs / 1024 / 1024:.0f} Mo, au-delà de la limite de téléchargement "
+                            f"({TAILLE_MAX_TELECHARGEMENT_MO} Mo, variable CDLJ_TELECHARGEMENT_MAX_MO)"
+                        )
+                    else:
+                        # st.download_button recopie le fichier dans le gestionnaire de médias (en mémoire) : d'où la limite de taille
+                        with open(chemin_packs, "rb") as archive_packs:
+                            st.download_button(
+                                label="📥 Télécharger les dossiers par vicariat",
+                                data=archive_packs,
+                                file_name=f"dossiers_vicariats_{activite}_{datetime.now().year}.zip",
+                                mime="application/zip",
+                                key=f"telecharger_packs_{activite}",
+                                on_click="ignore"
+                            )
+                finally:
+                    # L'archive ne survit jamais au rendu : rien ne s'accumule dans le dossier temporaire
+                    os.remove(chemin_packs)
+            
+            if st.button("🌐 Publier pour la consultation en ligne", key=f"publier_{activite}"):
+                with st.spinner("Calcul des clés de consultation en cours..."):
+                    chemin_publication, publies, sans_date = publier_resultats(df_resultats, df_complet, activite)
+                st.success(f"✅ {publies} résultats publiés dans {chemin_publication}")
+                if sans_date:
+                    st.warning(f"⚠️ {sans_date} candidat(s) sans date de naissance valide : résultat non consultable en ligne")
+                st.caption("Consultation par matricule et date de naissance : `python service_resultats.py`, puis /resultats/<activite>/<matricule>?naissance=AAAA-MM-JJ")
+            
+            if st.button("🗃️ Générer le site statique des résultats (ZIP)", key=f"site_statique_{activite}"):
+                with st.spinner("Calcul des clés de consultation en cours..."):
+                    site_statique, sans_date = generer_publication_statique(df_resultats, df_complet, activite)
+                if sans_date:
+                    st.warning(f"⚠️ {sans_date} candidat(s) sans date de naissance valide : résultat absent du site")
+                st.download_button(
+                    label="📥 Télécharger le site statique",
+                    data=site_statique,
+                    file_name=f"site_resultats_{activite}_{datetime.now().year}.zip",
+                    mime="application/zip",
+                    key=f"telecharger_site_{activite}",
+                    on_click="ignore"
+                )
+                st.caption("Décompresser l'archive sur n'importe quel hébergement statique : la recherche (matricule et date de naissance) se fait dans le navigateur, en HTTPS.")
+            
+            afficher_export_bulletins(df_resultats, df_complet, activite)
         else:
             st.info("ℹ️ Veuillez d'abord importer et corriger les notes dans l'onglet 'Correction'")
+    
+    with tab5:
+        afficher_comparaison_historique()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
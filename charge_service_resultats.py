@@ -0,0 +1,103 @@
+"""Mesure de débit du service de consultation des résultats (service_resultats.py)
+
+Lancement : python charge_service_resultats.py resultats_publies_weekend.json identifiants.csv
+            [--url http://127.0.0.1:8502] [--connexions 20] [--requetes 2000] [--sel sel_consultation.key]
+
+identifiants.csv : une ligne « matricule;date_naissance » (AAAA-MM-JJ ou JJ/MM/AAAA) par candidat,
+l'instantané ne contenant que des clés dérivées. Chaque recherche dérive sa clé (PBKDF2) :
+le débit est borné par ce calcul, pas par l'index.
+"""
+import argparse
+import csv
+import http.client
+import json
+import random
+import threading
+import time
+from urllib.parse import quote, urlencode, urlparse
+
+from service_resultats import CHEMIN_SEL, IndexResultats, lire_sel
+
+def percentile(valeurs, p):
+    """Percentile p (0-100) d'une liste triée"""
+    return valeurs[min(len(valeurs) - 1, int(len(valeurs) * p / 100))]
+
+def lire_identifiants(chemin):
+    """Couples (matricule, date de naissance) à interroger"""
+    with open(chemin, encoding='utf-8-sig', newline='') as fichier:
+        return [(ligne[0], ligne[1]) for ligne in csv.reader(fichier, delimiter=';') if len(ligne) >= 2]
+
+def mesurer_index(chemin, sel, cles):
+    """Durée moyenne (ms) d'une recherche dans l'index en mémoire, dérivation de la clé comprise, sans le réseau"""
+    index = IndexResultats([chemin], sel)
+    index.charger()
+    echantillon = [random.choice(cles) for _ in range(50)]
+    rechercher = index.rechercher
+    debut = time.perf_counter()
+    for activite, matricule, naissance in echantillon:
+        rechercher(activite, matricule, naissance)
+    return (time.perf_counter() - debut) / len(echantillon) * 1000
+
+def client(url, cles, nombre, latences, erreurs):
+    """Une connexion persistante qui enchaîne des recherches de matricules tirés au hasard"""
+    connexion = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=10)
+    for _ in range(nombre):
+        activite, matricule, naissance = random.choice(cles)
+        debut = time.perf_counter()
+        try:
+            connexion.request('GET', f"/resultats/{quote(activite)}/{quote(matricule)}?{urlencode({'naissance': naissance})}")
+            reponse = connexion.getresponse()
+            reponse.read()
+            if reponse.status != 200:
+                erreurs.append(reponse.status)
+        except (OSError, http.client.HTTPException) as e:
+            erreurs.append(str(e))
+            connexion.close()
+            connexion = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=10)
+            continue
+        latences.append(time.perf_counter() - debut)
+    connexion.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesure de débit du service de consultation des résultats")
+    parser.add_argument('instantane', help="Instantané publié")
+    parser.add_argument('identifiants', help="CSV matricule;date_naissance des candidats à interroger")
+    parser.add_argument('--url', default='http://127.0.0.1:8502')
+    parser.add_argument('--connexions', type=int, default=20)
+    parser.add_argument('--requetes', type=int, default=2000)
+    parser.add_argument('--sel', default=CHEMIN_SEL, help="Fichier du sel secret écrit par le tableau de bord")
+    args = parser.parse_args()
+
+    with open(args.instantane, encoding='utf-8') as fichier:
+        instantane = json.load(fichier)
+    cles = [(instantane['activite'], matricule, naissance) for matricule, naissance in lire_identifiants(args.identifiants)]
+    if not cles:
+        parser.error("aucun identifiant à interroger")
+
+    print(f"Recherche dans l'index en mémoire : {mesurer_index(args.instantane, lire_sel(args.sel), cles):.2f} ms")
+
+    url = urlparse(args.url)
+    latences, erreurs = [], []
+    par_connexion = args.requetes // args.connexions
+    clients = [
+        threading.Thread(target=client, args=(url, cles, par_connexion, latences, erreurs))
+        for _ in range(args.connexions)
+    ]
+    debut = time.perf_counter()
+    for c in clients:
+        c.start()
+    for c in clients:
+        c.join()
+    duree = time.perf_counter() - debut
+
+    latences.sort()
+    print(f"{len(latences)} requêtes en {duree:.2f} s avec {args.connexions} connexions : {len(latences) / duree:.0f} requêtes/s")
+    if latences:
+        print("Latence (ms) : p50 {:.2f}  p95 {:.2f}  p99 {:.2f}".format(
+            *(percentile(latences, p) * 1000 for p in (50, 95, 99))
+        ))
+    if erreurs:
+        print(f"{len(erreurs)} erreur(s), par exemple : {erreurs[:5]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Rendu des bulletins de résultats individuels (exécuté dans les processus de travail)"""
+from io import BytesIO
+
+COLONNES_COMPOS = ['COMPO1', 'COMPO2', 'COMPO3', 'COMPO4', 'COMPO5']
+BULLETINS_PAR_PAGE = 3
+
+# Gabarits (géométrie, polices, couleurs, textes d'en-tête) construits une seule fois par processus
+_GABARITS = {}
+
+def gabarit(titre_activite, annee):
+    """Gabarit partagé par tous les bulletins d'une activité rendus dans ce processus"""
+    if (titre_activite, annee) not in _GABARITS:
+        _GABARITS[(titre_activite, annee)] = construire_gabarit(titre_activite, annee)
+    return _GABARITS[(titre_activite, annee)]
+
+def construire_gabarit(titre_activite, annee):
+    """Préparer la géométrie, les couleurs et les positions des champs d'un bulletin"""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import cm
+
+    largeur_page, hauteur_page = A4
+    marge = 1.5*cm
+    pas = (hauteur_page - 2*marge) / BULLETINS_PAR_PAGE
+    largeur = largeur_page - 2*marge
+    ligne = 0.6*cm
+    g = {
+        'page': A4,
+        'marge': marge,
+        'largeur': largeur,
+        'hauteur': pas - 0.5*cm,
+        'pas': pas,
+        'entete': [
+            ("Helvetica-Bold", 9, "ARCHIDIOCESE DE COTONOU"),
+            ("Helvetica-Bold", 9, "COMMUNAUTE DIOCESAINE DES LECTEURS JUNIORS"),
+            ("Helvetica-Bold", 11, f"{titre_activite.upper()} {annee} - BULLETIN DE RÉSULTATS")
+        ],
+        'colonnes_notes': COLONNES_COMPOS + ['Moyenne', 'Rang'],
+        'largeur_colonne': (largeur - 16) / 7,
+        'ligne': ligne,
+        'y_table': -7.5*ligne,
+        'gris': colors.gray,
+        'beige': colors.beige,
+        'blanc': colors.whitesmoke,
+        'noir': colors.black
+    }
+    g['champs'] = disposer_champs(g)
+    return g
+
+def formater_note(valeur):
+    """Note affichée sur le bulletin (tiret si absente)"""
+    return "-" if valeur is None or valeur != valeur else f"{valeur:.2f}"
+
+def disposer_champs(g):
+    """Position (x, y relatives au coin supérieur gauche) des libellés fixes et des valeurs de chaque bulletin"""
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    ligne, gauche, milieu = g['ligne'], 8, g['largeur'] / 2
+    champs = [
+        ("Matricule :", 'matricule', gauche, -3.2*ligne),
+        ("Grade :", 'grade', milieu, -3.2*ligne),
+        ("Nom et prénoms :", 'nom_complet', gauche, -4.0*ligne),
+        ("Paroisse :", 'paroisse', gauche, -4.8*ligne),
+        ("Vicariat :", 'vicariat', milieu, -4.8*ligne),
+        ("Mention :", 'mention', gauche, -9.8*ligne),
+        ("Décision :", 'decision', milieu, -9.8*ligne)
+    ]
+    return [(libelle, cle, x, y, x + stringWidth(libelle, "Helvetica-Bold", 9) + 4) for libelle, cle, x, y in champs]
+
+def definir_gabarit(c, g):
+    """Dessiner une seule fois par document la partie fixe d'un bulletin (objet PDF réutilisé par chaque bulletin)"""
+    ligne = g['ligne']
+    c.beginForm('gabarit')
+    c.setStrokeColor(g['noir'])
+    c.setFillColor(g['noir'])
+    c.rect(0, -g['hauteur'], g['largeur'], g['hauteur'])
+
+    y = -0.3*ligne
+    for police, taille, texte in g['entete']:
+        y -= taille + 3
+        c.setFont(police, taille)
+        c.drawCentredString(g['largeur'] / 2, y, texte)
+
+    c.setFont("Helvetica-Bold", 9)
+    for libelle, _, x, y, _ in g['champs']:
+        c.drawString(x, y, libelle)
+
+    # Tableau des notes : ligne d'en-tête grise, ligne des valeurs
+    y_table = g['y_table']
+    c.setFillColor(g['gris'])
+    c.rect(8, y_table, g['largeur'] - 16, ligne, stroke=1, fill=1)
+    c.setFillColor(g['beige'])
+    c.rect(8, y_table - ligne, g['largeur'] - 16, ligne, stroke=1, fill=1)
+    c.setFillColor(g['blanc'])
+    for i, entete in enumerate(g['colonnes_notes']):
+        gauche = 8 + i * g['largeur_colonne']
+        if i:
+            c.line(gauche, y_table - ligne, gauche, y_table + ligne)
+        c.drawCentredString(gauche + g['largeur_colonne'] / 2, y_table + 0.3*ligne, entete)
+    c.endForm()
+
+def dessiner_bulletin(c, g, candidat, haut):
+    """Dessiner un bulletin dont le bord supérieur est à l'ordonnée haut : gabarit partagé puis valeurs"""
+    c.saveState()
+    c.translate(g['marge'], haut)
+    c.doForm('gabarit')
+
+    texte = c.beginText()
+    texte.setFont("Helvetica", 9)
+    for _, cle, _, y, x_valeur in g['champs']:
+        texte.setTextOrigin(x_valeur, y)
+        texte.textOut(str(candidat[cle]))
+    c.drawText(texte)
+
+    valeurs = [formater_note(candidat.get(col)) for col in COLONNES_COMPOS] + [formater_note(candidat['moyenne']), str(candidat['rang'])]
+    c.setFont("Helvetica", 9)
+    y_valeurs = g['y_table'] - 0.7*g['ligne']
+    for i, valeur in enumerate(valeurs):
+        c.drawCentredString(8 + (i + 0.5) * g['largeur_colonne'], y_valeurs, valeur)
+    c.restoreState()
+
+def rendre_lot(lot):
+    """Rendre un lot (nom, candidats, titre de l'activité, année) en un PDF ; renvoie (nom, octets du PDF)"""
+    from reportlab.pdfgen import canvas
+
+    nom, candidats, titre_activite, annee = lot
+    g = gabarit(titre_activite, annee)
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=g['page'])
+    c.setTitle(nom)
+    definir_gabarit(c, g)
+    hauteur_page = g['page'][1]
+    for i, candidat in enumerate(candidats):
+        position = i % BULLETINS_PAR_PAGE
+        if i and position == 0:
+            c.showPage()
+        candidat['nom_complet'] = f"{candidat['nom']} {candidat['prenom']}"
+        dessiner_bulletin(c, g, candidat, hauteur_page - g['marge'] - position * g['pas'])
+    c.showPage()
+    c.save()
+    return nom, buffer.getvalue()
@@ -0,0 +1,100 @@
+"""Rendu des dossiers par vicariat : un PDF et un classeur Excel (exécuté dans les processus de travail)"""
+import numbers
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+COLONNES_RESULTATS = ['rang', 'matricule', 'nom', 'prenom', 'paroisse', 'moyenne', 'mention', 'decision']
+ENTETES_RESULTATS = ['Rang', 'Matricule', 'Nom', 'Prénoms', 'Paroisse', 'Moyenne', 'Mention', 'Décision']
+
+# Styles ReportLab construits une seule fois par processus
+_STYLES = None
+
+def styles_pack():
+    """Styles de paragraphe et de tableau partagés par tous les dossiers rendus dans ce processus"""
+    global _STYLES
+    if _STYLES is None:
+        from reportlab.lib import colors
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.platypus import TableStyle
+
+        styles = getSampleStyleSheet()
+        _STYLES = {
+            'entete': styles['Heading2'],
+            'titre': ParagraphStyle('TitrePack', parent=styles['Heading1'], fontSize=16, spaceAfter=20, alignment=1),
+            'section': styles['Heading3'],
+            'tableau': TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.gray),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, 0), 9),
+                ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+                ('FONTSIZE', (0, 1), (-1, -1), 8),
+                ('GRID', (0, 0), (-1, -1), 1, colors.black)
+            ])
+        }
+    return _STYLES
+
+def formater(valeur):
+    """Cellule de tableau PDF (réels à deux décimales, tiret si absent)"""
+    import pandas as pd
+
+    if pd.isna(valeur):
+        return "-"
+    if isinstance(valeur, numbers.Real) and not isinstance(valeur, numbers.Integral):
+        return f"{valeur:.2f}"
+    return str(valeur)
+
+def tableau(lignes, entetes):
+    """Tableau PDF stylé dont l'en-tête se répète sur chaque page"""
+    from reportlab.platypus import Table
+
+    table = Table([entetes] + [[formater(v) for v in ligne] for ligne in lignes], repeatRows=1)
+    table.setStyle(styles_pack()['tableau'])
+    return table
+
+def rendre_pdf(vicariat, resultats, synthese, titre_activite, annee):
+    """PDF du vicariat : synthèse par paroisse, puis classement de chaque grade"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import cm
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+
+    styles = styles_pack()
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=2*cm, bottomMargin=2*cm, title=f"Vicariat {vicariat}")
+    elements = [
+        Paragraph("ARCHIDIOCESE DE COTONOU", styles['entete']),
+        Paragraph("COMMUNAUTE DIOCESAINE DES LECTEURS JUNIORS", styles['entete']),
+        Paragraph(f"{titre_activite.upper()} {annee}", styles['entete']),
+        Paragraph(f"RÉSULTATS DU VICARIAT {escape(str(vicariat).upper())}", styles['titre']),
+        Paragraph("Synthèse par paroisse", styles['section']),
+        tableau(synthese.itertuples(index=False), list(synthese.columns)),
+        Spacer(1, 0.8*cm)
+    ]
+    for grade, df_grade in resultats.groupby('grade', sort=False):
+        elements.append(Paragraph(f"Grade : {escape(str(grade))}", styles['section']))
+        elements.append(tableau(df_grade[COLONNES_RESULTATS].itertuples(index=False), ENTETES_RESULTATS))
+        elements.append(Spacer(1, 0.8*cm))
+    doc.build(elements)
+    return buffer.getvalue()
+
+def rendre_xlsx(resultats, synthese):
+    """Classeur du vicariat : une feuille de synthèse et une feuille par grade"""
+    import pandas as pd
+
+    buffer = BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        synthese.to_excel(writer, sheet_name='Synthèse', index=False)
+        for grade, df_grade in resultats.groupby('grade', sort=False):
+            df_grade.drop(columns='grade').to_excel(writer, sheet_name=str(grade)[:31], index=False)
+    return buffer.getvalue()
+
+def rendre_pack(tache):
+    """Rendre le dossier d'un vicariat ; renvoie (vicariat, octets du PDF, octets du classeur)"""
+    vicariat, resultats, synthese, titre_activite, annee = tache
+    return (
+        vicariat,
+        rendre_pdf(vicariat, resultats, synthese, titre_activite, annee),
+        rendre_xlsx(resultats, synthese)
+    )
@@ -0,0 +1,176 @@
+"""Service de consultation des résultats proclamés (lecture seule, index des matricules en mémoire)
+
+Lancement :    python service_resultats.py [--hote 127.0.0.1] [--port 8502] [--sel sel_consultation.key]
+               [resultats_publies_weekend.json ...]
+Consultation : GET /resultats/<activite>/<matricule>?naissance=<AAAA-MM-JJ>
+               (ex. /resultats/weekend/001-AN1-25?naissance=2011-04-23)
+État :         GET /sante
+
+Les instantanés sont écrits par le tableau de bord (bouton « Publier pour la consultation »)
+et rechargés automatiquement lorsqu'ils sont republiés. Ils ne contiennent ni noms ni matricules :
+chaque résultat y est rangé sous une clé dérivée (PBKDF2) du matricule et de la date de naissance.
+Le sel de cette dérivation reste dans un fichier séparé, partagé par le tableau de bord et le service,
+qui ne doit être ni servi ni copié avec les instantanés.
+Le service écoute en local ; l'exposer derrière un proxy HTTPS.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import secrets
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote
+
+MOTIF_INSTANTANES = "resultats_publies_*.json"
+
+# Sel secret des clés de consultation (créé à la première publication, hors des instantanés)
+CHEMIN_SEL = "sel_consultation.key"
+
+# Dérivation volontairement lente : deviner matricules et dates de naissance coûte autant d'itérations par essai
+ITERATIONS_CONSULTATION = 100_000
+
+def cle_matricule(matricule):
+    """Clé de recherche d'un matricule (espaces et casse ignorés)"""
+    return matricule.strip().upper()
+
+def normaliser_date(texte):
+    """Date de naissance AAAA-MM-JJ à partir d'une saisie AAAA-MM-JJ ou JJ/MM/AAAA, ou None"""
+    for format_date in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(texte.strip(), format_date).strftime('%Y-%m-%d')
+        except ValueError:
+            pass
+    return None
+
+def cle_consultation(sel, matricule, date_naissance, iterations=ITERATIONS_CONSULTATION):
+    """Clé PBKDF2-SHA256 (matricule, date de naissance AAAA-MM-JJ) sous laquelle un résultat est publié"""
+    return hashlib.pbkdf2_hmac(
+        'sha256', f"{cle_matricule(matricule)}|{date_naissance}".encode('utf-8'), sel.encode('utf-8'), iterations
+    ).hex()
+
+def lire_sel(chemin=CHEMIN_SEL, creer=False):
+    """Sel secret des clés de consultation (créé, lisible du seul propriétaire, si creer est vrai)"""
+    if creer and not os.path.exists(chemin):
+        descripteur = os.open(chemin, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(descripteur, 'w', encoding='utf-8') as fichier:
+            fichier.write(secrets.token_hex(16))
+    with open(chemin, encoding='utf-8') as fichier:
+        return fichier.read().strip()
+
+class IndexResultats:
+    """Index (activité, empreinte) -> réponse JSON déjà encodée, remplacé d'un bloc à chaque rechargement"""
+
+    def __init__(self, chemins, sel):
+        self.chemins = list(chemins)
+        self.sel = sel
+        self.index = {}
+        self.versions = {}
+        self.charge_le = None
+
+    def charger(self):
+        """Relire les instantanés et remplacer l'index (les requêtes en cours gardent l'ancien)"""
+        index, versions = {}, {}
+        for chemin in self.chemins:
+            with open(chemin, encoding='utf-8') as fichier:
+                instantane = json.load(fichier)
+            activite = instantane['activite']
+            for cle, resultat in instantane['resultats'].items():
+                reponse = dict(resultat, activite=activite, annee=instantane['annee'], publie_le=instantane['publie_le'])
+                index[(activite, cle)] = json.dumps(reponse, ensure_ascii=False).encode('utf-8')
+            versions[chemin] = os.path.getmtime(chemin)
+        self.index, self.versions = index, versions
+        self.charge_le = time.strftime('%Y-%m-%dT%H:%M:%S')
+
+    def rechercher(self, activite, matricule, date_naissance):
+        """Réponse JSON encodée du candidat, ou None si le matricule et la date de naissance ne concordent pas"""
+        date_naissance = normaliser_date(date_naissance)
+        if date_naissance is None:
+            return None
+        return self.index.get((activite, cle_consultation(self.sel, matricule, date_naissance)))
+
+    def a_change(self):
+        """Vrai si un instantané a été republié depuis le dernier chargement"""
+        try:
+            return any(os.path.getmtime(chemin) != version for chemin, version in self.versions.items())
+        except OSError:
+            return False
+
+    def surveiller(self, intervalle=5):
+        """Recharger l'index en arrière-plan lorsque les instantanés changent"""
+        def boucle():
+            while True:
+                time.sleep(intervalle)
+                if self.a_change():
+                    try:
+                        self.charger()
+                    except (OSError, ValueError, KeyError):
+                        pass  # Instantané en cours d'écriture : nouvel essai au prochain tour
+        threading.Thread(target=boucle, daemon=True).start()
+
+def creer_gestionnaire(index):
+    """Classe de gestion des requêtes liée à un index"""
+
+    class GestionnaireResultats(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Connexions persistantes
+        disable_nagle_algorithm = True  # En-têtes et corps partent sans attendre l'accusé de réception
+
+        def do_GET(self):
+            chemin, _, requete = self.path.partition('?')
+            morceaux = [unquote(m) for m in chemin.strip('/').split('/')]
+            if len(morceaux) == 3 and morceaux[0] == 'resultats':
+                naissance = parse_qs(requete).get('naissance', [''])[0]
+                reponse = index.rechercher(morceaux[1], morceaux[2], naissance)
+                if reponse is None:
+                    self.repondre(404, b'{"erreur": "Matricule ou date de naissance incorrects"}')
+                else:
+                    self.repondre(200, reponse)
+            elif morceaux == ['sante']:
+                etat = {'candidats': len(index.index), 'instantanes': index.chemins, 'charge_le': index.charge_le}
+                self.repondre(200, json.dumps(etat, ensure_ascii=False).encode('utf-8'))
+            else:
+                self.repondre(404, b'{"erreur": "Adresse inconnue"}')
+
+        def repondre(self, statut, corps):
+            self.send_response(statut)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(corps)))
+            self.send_header('Cache-Control', 'no-store')  # Réponses nominatives : aucun cache partagé
+            self.end_headers()
+            self.wfile.write(corps)
+
+        def log_message(self, format, *args):
+            pass  # Pas de journal par requête
+
+    return GestionnaireResultats
+
+def main():
+    parser = argparse.ArgumentParser(description="Service de consultation des résultats proclamés")
+    parser.add_argument('instantanes', nargs='*', help=f"Instantanés publiés (par défaut {MOTIF_INSTANTANES})")
+    parser.add_argument('--hote', default='127.0.0.1', help="Adresse d'écoute (locale par défaut, à exposer derrière un proxy)")
+    parser.add_argument('--port', type=int, default=8502)
+    parser.add_argument('--sel', default=CHEMIN_SEL, help="Fichier du sel secret écrit par le tableau de bord")
+    args = parser.parse_args()
+
+    chemins = args.instantanes or sorted(glob.glob(MOTIF_INSTANTANES))
+    if not chemins:
+        parser.error(f"aucun instantané trouvé ({MOTIF_INSTANTANES}) : publiez d'abord les résultats depuis le tableau de bord")
+
+    if not os.path.exists(args.sel):
+        parser.error(f"sel introuvable ({args.sel}) : publiez d'abord les résultats depuis le tableau de bord")
+    index = IndexResultats(chemins, lire_sel(args.sel))
+    index.charger()
+    index.surveiller()
+    serveur = ThreadingHTTPServer((args.hote, args.port), creer_gestionnaire(index))
+    serveur.daemon_threads = True
+    print(f"{len(index.index)} résultats indexés - http://{args.hote}:{args.port}/resultats/<activite>/<matricule>?naissance=<AAAA-MM-JJ>")
+    try:
+        serveur.serve_forever()
+    except KeyboardInterrupt:
+        serveur.server_close()
+
+if __name__ == "__main__":
+    main()